@@ -8,24 +8,359 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog, simpledialog
 import subprocess
 import threading
+import queue
+from functools import partial, lru_cache
+from contextlib import contextmanager
+from collections import deque
 import re
+import itertools
 import os
+import stat
 import platform
 import ctypes
+import ctypes.wintypes
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 import string
 import time
-import webbrowser
 import shutil
 import sys
 import winreg
 import sqlite3
 import json
 import uuid
+import base64
 from datetime import datetime
 import math
 
+# Win32 entry points resolved once with explicit prototypes, so each call skips the
+# windll attribute lookup and ctypes argument inference
+_IsUserAnAdmin = ctypes.windll.shell32.IsUserAnAdmin
+_IsUserAnAdmin.argtypes = []
+_IsUserAnAdmin.restype = ctypes.c_int
+
+_DefineDosDeviceW = ctypes.windll.kernel32.DefineDosDeviceW
+_DefineDosDeviceW.argtypes = [ctypes.wintypes.DWORD, ctypes.wintypes.LPCWSTR, ctypes.wintypes.LPCWSTR]
+_DefineDosDeviceW.restype = ctypes.wintypes.BOOL
+
+_CopyFileExW = ctypes.windll.kernel32.CopyFileExW
+_CopyFileExW.argtypes = [ctypes.wintypes.LPCWSTR, ctypes.wintypes.LPCWSTR, ctypes.c_void_p,
+                         ctypes.c_void_p, ctypes.POINTER(ctypes.wintypes.BOOL), ctypes.wintypes.DWORD]
+_CopyFileExW.restype = ctypes.wintypes.BOOL
+
+# Shared HTTP session so repeated downloads reuse the pooled TLS connection
+_HTTP = requests.Session()
+_HTTP.headers.update({'User-Agent': 'image-creator/1.0'})
+# Downloads are sequential, so a small pool suffices; transient connect/5xx failures are
+# retried with backoff instead of failing the whole download
+_HTTP.mount("https://", HTTPAdapter(
+    pool_connections=2, pool_maxsize=2,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504))
+))
+
+# Every PowerShell launch skips the logo, profile and interactive prompts; append "-Command", ...
+_POWERSHELL = ["powershell", "-NoLogo", "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass",
+               "-OutputFormat", "Text"]
+
+# PowerShell 7 starts faster, so commands that only use cmdlets it supports natively run
+# under pwsh when installed. Anything relying on WMI v1 or AppX cmdlets stays on _POWERSHELL
+_POWERSHELL_CORE = [shutil.which("pwsh") or "powershell"] + _POWERSHELL[1:]
+
+_SYSPREP_DIR = Path(r"C:\Windows\System32\Sysprep")
+
+# Folder holding this script or the frozen executable; pure path arithmetic, no resolve()
+_APP_DIR = Path(sys.executable if getattr(sys, 'frozen', False) else __file__).parent
+
+# Sysprep answer file written by the generalization step, pre-encoded since it never changes
+_UNATTEND_XML = """<?xml version="1.0" encoding="utf-8"?>
+<unattend xmlns="urn:schemas-microsoft-com:unattend">
+    <settings pass="specialize">
+        <component name="Microsoft-Windows-Shell-Setup" processorArchitecture="amd64" publicKeyToken="31bf3856ad364e35" language="neutral" versionScope="nonSxS">
+            <CopyProfile>true</CopyProfile>
+            <UserAccounts>
+                <LocalAccounts>
+                    <LocalAccount wcm:action="add" xmlns:wcm="http://schemas.microsoft.com/WMIConfig/2002/State">
+                        <Name>installadmin</Name>
+                        <Group>Administrators</Group>
+                        <Password><Value>DTC@dental2025</Value><PlainText>true</PlainText></Password>
+                    </LocalAccount>
+                </LocalAccounts>
+            </UserAccounts>
+            <AutoLogon>
+                <Enabled>true</Enabled>
+                <Username>installadmin</Username>
+                <Password><Value>DTC@dental2025</Value><PlainText>true</PlainText></Password>
+            </AutoLogon>
+        </component>
+    </settings>
+    <settings pass="oobeSystem">
+        <component name="Microsoft-Windows-Shell-Setup" processorArchitecture="amd64" publicKeyToken="31bf3856ad364e35" language="neutral" versionScope="nonSxS">
+            <OOBE><HideEULAPage>true</HideEULAPage><HideLocalAccountScreen>true</HideLocalAccountScreen><HideOnlineAccountScreens>true</HideOnlineAccountScreens><HideWirelessSetupInOOBE>true</HideWirelessSetupInOOBE><ProtectYourPC>1</ProtectYourPC><SkipMachineOOBE>true</SkipMachineOOBE></OOBE>
+        </component>
+    </settings>
+</unattend>
+""".encode("utf-8")
+
+# Text of the confirmation dialog shown before generalizing outside Audit Mode
+_AUDIT_WARNING_TEXT = """⚠️  CRITICAL WARNING: NOT IN AUDIT MODE  ⚠️
+
+You are about to run Sysprep Generalize on a system that is NOT in Audit Mode.
+
+🔥 THIS IS EXTREMELY DANGEROUS AND WILL:
+   • Remove all user accounts and profiles (except built-in accounts)
+   • Delete user data and personalization
+   • Reset Windows activation
+   • Make the system non-bootable for current users
+   • Require complete reconfiguration after reboot
+
+📋 AUDIT MODE is the SAFE way to prepare images:
+   • Boot to audit mode: Ctrl+Shift+F3 during OOBE
+   • Or run: sysprep /audit /reboot
+   • Then run this generalization tool
+
+🛡️  RECOMMENDED ACTIONS:
+   1. STOP NOW and reboot to audit mode first
+   2. Or ensure this is a disposable test system
+   3. Or create a full system backup before continuing
+
+⚠️  DO NOT CONTINUE ON PRODUCTION SYSTEMS  ⚠️
+
+Are you absolutely certain you want to proceed?
+This action cannot be undone!"""
+
+_AUDIT_FINAL_CONFIRMATION_TEXT = """FINAL CONFIRMATION REQUIRED
+
+Proceeding will PERMANENTLY ALTER your Windows installation.
+
+Type 'I UNDERSTAND THE RISK' below to confirm:"""
+
+# Matches AppX packages that block Sysprep generalize in setuperr.log
+_SYSPREP_BLOCKER_PATTERN = re.compile(rb'SYSPRP Package (.*?) was installed for a user')
+
+# Display names of installed agents that break imaging (generalization STEP 2)
+_PROBLEM_APP_PATTERN = re.compile(r'veeam|snapagent|blackpoint', re.IGNORECASE)
+
+# vssadmin output parsing: "Shadow Copy ID: {guid}" and "Shadow Copy Volume: \\?\GLOBALROOT\Device\..."
+_SHADOW_ID_PATTERN = re.compile(r'Shadow Copy ID: \{([^}]+)\}')
+_SHADOW_VOLUME_PATTERN = re.compile(r'Shadow Copy Volume:[ \t]*(\S*HarddiskVolumeShadowCopy\d+)')
+
+# Generalization STEP 1: remove local user accounts and their profiles
+_STEP1_REMOVE_USERS_CMD = """
+    $currentUser = ([System.Security.Principal.WindowsIdentity]::GetCurrent().Name).Split('\\')[-1]
+    $systemAccounts = @('Administrator','DefaultAccount','Guest','WDAGUtilityAccount', $currentUser)
+    $systemProfiles = @('Administrator','DefaultAccount','Guest','WDAGUtilityAccount','Public', $currentUser)
+
+    Write-Host "--- Removing local user accounts ---"
+    Get-LocalUser | Where-Object { $_.Name -notin $systemAccounts } | ForEach-Object {
+        Write-Host "Removing user: $($_.Name)"
+        try { Remove-LocalUser -Name $_.Name -ErrorAction Stop } catch { Write-Warning $_.Exception.Message }
+    }
+
+    Write-Host "--- Removing local user profiles ---"
+    # Query the profile list once and index it by path, rather than a CIM query per folder
+    $profileMap = @{}
+    Get-CimInstance Win32_UserProfile | Where-Object { $_.LocalPath } | ForEach-Object { $profileMap[$_.LocalPath.ToLower()] = $_ }
+    Get-ChildItem -Path 'C:\\Users' -Directory | Where-Object { $_.Name -notin $systemProfiles } | ForEach-Object {
+        $folder = $_
+        Write-Host "Removing profile folder: $($folder.FullName)"
+        try {
+            $userProfile = $profileMap[$folder.FullName.ToLower()]
+            if ($userProfile) {
+                Remove-CimInstance -InputObject $userProfile -ErrorAction SilentlyContinue
+                Write-Host "Removed registry entry for: $($folder.Name)"
+            }
+            Remove-Item -Path $folder.FullName -Recurse -Force -ErrorAction Stop
+        } catch {
+            Write-Warning "Failed to remove profile '$($folder.Name)': $($_.Exception.Message)"
+        }
+    }
+"""
+
+# Generalization STEP 3: clear RMM/backup agent identity data
+_STEP3_CLEAR_AGENT_DATA_CMD = """
+    try { Remove-ItemProperty -Path 'HKLM:\\SOFTWARE\\WOW6432Node\\NinjaRMM LLC\\NinjaRMMAgent\\Agent' -Name 'NodeId' -Force -ErrorAction Stop; Write-Host 'Removed NinjaRMM NodeId' } catch {}
+    try { Remove-Item -Path 'HKLM:\\SOFTWARE\\Veeam' -Recurse -Force -ErrorAction Stop; Write-Host 'Removed Veeam registry key' } catch {}
+    try { Remove-Item -Path 'C:\\ProgramData\\NinjaRMMAgent' -Recurse -Force -ErrorAction Stop; Write-Host 'Removed NinjaRMM data folder' } catch {}
+    try { Remove-Item -Path 'C:\\ProgramData\\Veeam' -Recurse -Force -ErrorAction Stop; Write-Host 'Removed Veeam data folder' } catch {}
+"""
+
+# Generalization STEP 4: disable BitLocker and wait for decryption
+_STEP4_DISABLE_BITLOCKER_CMD = """
+    $encryptedVolumes = Get-BitLockerVolume | Where-Object { $_.VolumeStatus -ne 'FullyDecrypted' }
+    if ($encryptedVolumes) {
+        Write-Host "Disabling BitLocker on encrypted volumes..."
+        $encryptedVolumes | ForEach-Object {
+            Write-Host "Disabling on $($_.MountPoint)..."
+            try { Disable-BitLocker -MountPoint $_.MountPoint -ErrorAction Stop } catch { Write-Warning "Failed to disable BitLocker on $($_.MountPoint): $($_.Exception.Message)" }
+        }
+        # Wait for decryption, woken when a volume reaches FullyDecrypted (ConversionStatus 0)
+        # where events are available, rather than on every progress change
+        $eventSource = $null
+        try {
+            Register-CimIndicationEvent -Namespace 'Root\\CIMV2\\Security\\MicrosoftVolumeEncryption' -Query "SELECT * FROM __InstanceModificationEvent WITHIN 1 WHERE TargetInstance ISA 'Win32_EncryptableVolume' AND TargetInstance.ConversionStatus = 0" -SourceIdentifier 'BitLockerDecryption' -ErrorAction Stop
+            $eventSource = 'BitLockerDecryption'
+        } catch {
+            Write-Host "Volume change events unavailable, polling every second instead."
+        }
+        try {
+            $lastPercent = $null
+            while ($decrypting = @(Get-BitLockerVolume | Where-Object { $_.VolumeStatus -eq 'DecryptionInProgress' })) {
+                $percent = ($decrypting | Measure-Object -Property EncryptionPercentage -Maximum).Maximum
+                if ($percent -ne $lastPercent) {
+                    Write-Host "Waiting for BitLocker decryption to complete... ($percent% still encrypted)"
+                    $lastPercent = $percent
+                }
+                if ($eventSource) {
+                    # Time out so progress is still reported while decryption runs
+                    Wait-Event -SourceIdentifier $eventSource -Timeout 10 | Out-Null
+                    Remove-Event -SourceIdentifier $eventSource -ErrorAction SilentlyContinue
+                } else {
+                    Start-Sleep -Seconds 1
+                }
+            }
+        } finally {
+            if ($eventSource) { Unregister-Event -SourceIdentifier $eventSource -ErrorAction SilentlyContinue }
+        }
+        Write-Host "BitLocker decryption complete."
+    } else {
+        Write-Host "No encrypted BitLocker volumes found."
+    }
+"""
+
+# Generalization STEP 5: clear event logs and Panther logs
+_STEP5_CLEAR_LOGS_CMD = """
+    wevtutil.exe cl Application
+    wevtutil.exe cl Security
+    wevtutil.exe cl Setup
+    wevtutil.exe cl System
+    if (Test-Path "$env:SystemRoot\\Panther") { Remove-Item -Path "$env:SystemRoot\\Panther\\*" -Recurse -Force }
+"""
+
+# Removes AppX packages installed for a user but not provisioned for the image - the
+# usual cause of "SYSPRP Package ... was installed for a user" failures - before Sysprep
+# runs, so the Sysprep retry loop rarely needs more than one attempt
+_PREFLIGHT_APPX_CLEANUP_CMD = """
+    $provisioned = @((Get-AppxProvisionedPackage -Online).DisplayName)
+    $candidates = Get-AppxPackage -AllUsers | Where-Object {
+        -not $_.NonRemovable -and -not $_.IsFramework -and $_.SignatureKind -ne 'System' -and $provisioned -notcontains $_.Name
+    }
+    foreach ($package in $candidates) {
+        try {
+            Remove-AppxPackage -Package $package.PackageFullName -AllUsers -ErrorAction Stop
+            Write-Host "Removed per-user package: $($package.Name)"
+        } catch {
+            Write-Warning "Could not remove $($package.Name): $($_.Exception.Message)"
+        }
+    }
+"""
+
+# Clears the Panther logs so setuperr.log only holds the latest Sysprep run
+_CLEAR_SYSPREP_PANTHER_CMD = "if (Test-Path 'C:\\Windows\\System32\\Sysprep\\Panther') { Remove-Item -Path 'C:\\Windows\\System32\\Sysprep\\Panther\\*' -Recurse -Force }"
+
+# Removes the AppX blockers listed in $blockersToRemove (set by the caller), then clears
+# the Panther logs for the next Sysprep attempt. Only the blocker list changes per attempt
+_REMOVE_APPX_BLOCKERS_CMD = """
+    # Per-user packages are removed in their own runspace (PowerShell 5.1 has no
+    # ForEach-Object -Parallel), up to 8 at a time
+    $removeBlocker = {
+        param($blocker)
+        Get-AppxPackage -AllUsers -Name "*$blocker*" | Remove-AppxPackage -AllUsers
+        $?
+    }
+    $removedBlockers = @{}
+    $pool = [runspacefactory]::CreateRunspacePool(1, [Math]::Min(8, $blockersToRemove.Count))
+    $pool.Open()
+    $jobs = foreach ($blocker in $blockersToRemove) {
+        $ps = [powershell]::Create().AddScript($removeBlocker).AddArgument($blocker)
+        $ps.RunspacePool = $pool
+        [pscustomobject]@{ Blocker = $blocker; PowerShell = $ps; Handle = $ps.BeginInvoke() }
+    }
+    foreach ($job in $jobs) {
+        $removed = $job.PowerShell.EndInvoke($job.Handle) | Select-Object -Last 1
+        foreach ($err in $job.PowerShell.Streams.Error) {
+            Write-Host "WARNING: Removing $($job.Blocker): $err"
+        }
+        $job.PowerShell.Dispose()
+        if ($removed) { $removedBlockers[$job.Blocker] = $true }
+    }
+    $pool.Close()
+
+    # Provisioned packages go through online DISM servicing, which only allows one
+    # operation at a time, so these are removed serially. The provisioned list is
+    # enumerated once and matched with .NET string methods
+    $provisioned = @((Get-AppxProvisionedPackage -Online).PackageName)
+    foreach ($blocker in $blockersToRemove) {
+        foreach ($packageName in $provisioned.Where({ $_.IndexOf($blocker, [StringComparison]::OrdinalIgnoreCase) -ge 0 })) {
+            try {
+                Remove-AppxProvisionedPackage -Online -PackageName $packageName -ErrorAction Stop | Out-Null
+                $removedBlockers[$blocker] = $true
+            } catch {
+                Write-Host "WARNING: Removing provisioned package $packageName`: $($_.Exception.Message)"
+            }
+        }
+    }
+
+    foreach ($blocker in $removedBlockers.Keys) { Write-Host "Removed blocker: $blocker" }
+    $totalRemoved = $removedBlockers.Count
+    """ + _CLEAR_SYSPREP_PANTHER_CMD + """
+    return $totalRemoved
+"""
+
+# Seconds a "restic snapshots" repository probe may run; an unreachable SMB share would
+# otherwise stall the calling worker for as long as Windows keeps retrying the connection
+_RESTIC_PROBE_TIMEOUT = 120
+
+# Paths restic skips on every backup; built once rather than per run. restic tests every
+# file against every pattern, so keep this free of duplicates and subsumed patterns
+_RESTIC_EXCLUSIONS = (
+    "C:/Windows/Temp/*", "C:/Windows/Logs/*", "C:/Windows/Prefetch/*",
+    "C:/Temp/*", "C:/$Recycle.Bin/*", "C:/System Volume Information/*",
+    "C:/pagefile.sys", "C:/hiberfil.sys", "C:/swapfile.sys",
+    "*/Temporary Internet Files/*", "*/AppData/Local/Temp/*",
+    "*/AppData/Local/Microsoft/Windows/INetCache/*",
+    "C:/Windows/SoftwareDistribution/*",  # Windows Update files
+    "C:/Windows/Installer/*",  # MSI installer cache
+    "C:/ProgramData/Microsoft/Windows/WER/*",  # Windows Error Reporting
+    "*OneDrive*",  # OneDrive cloud-only files that cause VSS issues
+    # UWP/Windows Store App exclusions (cause access denied errors)
+    "C:/ProgramData/Packages/*",  # All UWP app package data
+    "C:/Program Files/WindowsApps/*",  # Windows Store apps
+    "*/AppData/Local/Packages/*",  # User UWP app data
+    "*/AppData/Local/Microsoft/WindowsApps/*",  # Windows app shortcuts
+    "C:/Windows/SystemApps/*",  # System UWP apps
+    # Specific cache patterns that cause issues
+    "*/SystemAppData/Helium/Cache/*",  # Helium cache files
+    "*/AppData/Local/ConnectedDevicesPlatform/*",  # Connected devices cache
+    "*/AppData/Local/Microsoft/Windows/Explorer/*",  # Explorer cache
+    "C:/ProgramData/USOPrivate/*",  # Update session orchestrator
+    "C:/ProgramData/USOShared/*",   # Update session orchestrator shared
+    # Additional problematic Windows areas
+    "C:/Windows/CloudAPCache/*",  # Azure AD and cloud authentication cache
+    "C:/Windows/SystemTemp/*",   # System temporary files
+    "C:/Windows/System32/config/*/AppData/Local/Microsoft/Windows/CloudAPCache/*",  # All system profiles cloud cache
+    "C:/Windows/CbsTemp/*",  # Component-based servicing temp
+    # Security and Defender exclusions (cause access denied errors)
+    "C:/ProgramData/Microsoft/Crypto/*",  # Cryptographic keys and certificates
+    "C:/ProgramData/Microsoft/Windows/CapabilityAccessManager/*",  # Capability access manager
+    "C:/ProgramData/Microsoft/Windows/SystemData/*",  # System data and lock screen images
+    "C:/ProgramData/Microsoft/Windows Defender Advanced Threat Protection/*",  # Defender ATP
+    "*/Windows Defender/*",  # Windows Defender files, wherever they live
+    "*/Windows Security/*",  # Windows Security app data
+    # Client Side Caching and WMI exclusions (cause access denied errors)
+    "*/LogFiles/WMI/*",  # WMI event trace logs, including RtBackup
+    "*/CSC/*",  # Client Side Caching (Offline Files)
+)
+
+# Extra user-data paths skipped for OS-only backups
+_RESTIC_OS_EXCLUSIONS = (
+    "C:/Users/*/Documents/*", "C:/Users/*/Downloads/*", 
+    "C:/Users/*/Pictures/*", "C:/Users/*/Videos/*",
+    "C:/Users/*/Music/*", "C:/Users/*/Desktop/*",
+    "C:/Users/*/AppData/Local/*", "C:/Users/*/AppData/LocalLow/*"
+)
+
 def check_platform():
     """Check if running on Windows"""
     if platform.system() != 'Windows':
@@ -35,6 +370,16 @@ def check_platform():
         return False
     return True
 
+# Cached result of is_user_admin()
+_IS_ADMIN = None
+
+def is_user_admin():
+    """Check whether the process is elevated; IsUserAnAdmin is only called once"""
+    global _IS_ADMIN
+    if _IS_ADMIN is None:
+        _IS_ADMIN = bool(_IsUserAnAdmin())
+    return _IS_ADMIN
+
 def generate_uuidv7():
     """Generate a UUIDv7 (time-ordered UUID)"""
     # UUIDv7 implementation - timestamp-based
@@ -56,6 +401,26 @@ def generate_uuidv7():
     uuid_int = (time_high << 96) | (time_low << 80) | (version << 76) | (rand_a << 64) | variant | rand_b
     return str(uuid.UUID(int=uuid_int))
 
+def copy_file_unbuffered(src, dst):
+    """Copy a file with CopyFileExW, bypassing the system cache for large files"""
+    # COPY_FILE_NO_BUFFERING avoids double-buffering big sequential copies (e.g. restic packs)
+    flags = 0x00001000 if os.path.getsize(src) > 1024 * 1024 else 0
+    if _CopyFileExW(str(src), str(dst), None, None, None, flags):
+        return dst
+    if not flags:
+        raise ctypes.WinError()
+    # Some targets (e.g. certain network shares) reject unbuffered I/O; retry with a
+    # regular copy, which raises with its own reason if the copy itself is the problem
+    return shutil.copy2(src, dst)
+
+@lru_cache(maxsize=16)
+def _disk_usage_cached(path, bucket):
+    return shutil.disk_usage(path)
+
+def cached_disk_usage(path):
+    """shutil.disk_usage, cached per path for about 2 seconds (UNC shares are slow to query)"""
+    return _disk_usage_cached(str(path), int(time.monotonic() / 2))
+
 class DatabaseManager:
     """Manages SQLite database for image management"""
     
@@ -247,15 +612,21 @@ class DatabaseManager:
     def find_largest_volume(self):
         """Find the volume with the most free space"""
         try:
-            import shutil
             volumes = []
             
-            # Get all available drives
-            for drive_letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+            # Get all available drives from one GetLogicalDrives bitmask rather than
+            # probing all 26 letters (a stat on an empty or disconnected drive can stall)
+            drive_mask = ctypes.windll.kernel32.GetLogicalDrives()
+            for bit, drive_letter in enumerate(string.ascii_uppercase):
                 drive_path = f"{drive_letter}:\\"
-                if os.path.exists(drive_path):
+                if (drive_mask >> bit) & 1:
+                    # Only stage working VHDX files on local fixed disks (DRIVE_FIXED = 3);
+                    # mapped SMB shares often report the most free space but small
+                    # synchronous writes to them make VHDX creation/restore far slower
+                    if ctypes.windll.kernel32.GetDriveTypeW(drive_path) != 3:
+                        continue
                     try:
-                        free_space = shutil.disk_usage(drive_path).free
+                        free_space = cached_disk_usage(drive_path).free
                         volumes.append((drive_path, free_space))
                     except:
                         continue
@@ -613,6 +984,14 @@ class DatabaseManager:
         return sqlite3.connect(self.db_path)
 
 class WindowsImagePrepGUI:
+    # Workflow step titles, indexed by step number - 1
+    STEP_NAMES = (
+        "Create System Backup",
+        "Professional Image & VM Management",
+        "Generalize & Cleanup"
+    )
+    STEP_NAME_BY_NUM = dict(enumerate(STEP_NAMES, 1))
+
     def __init__(self, root):
         self.root = root
         self.root.title("OS Imaging and Processing Tool - Professional Edition")
@@ -622,6 +1001,34 @@ class WindowsImagePrepGUI:
         # Store instance reference for database access
         WindowsImagePrepGUI.__instance = self
 
+        # Log messages from any thread are queued and flushed to the log area in batches;
+        # deque append/popleft are atomic, so no lock is taken per message. Bounded, so a
+        # long run while the window is minimized drops the oldest lines instead of growing
+        self._log_queue = deque(maxlen=5000)
+        # Error dialogs requested by worker threads are kept apart so they are never dropped
+        self._dialog_queue = deque()
+
+        # Shadow copy ID -> device path, filled in when create_vss_shadow_copy creates one
+        self._vss_shadow_paths = {}
+
+        # (mask, timestamp) of the last GetLogicalDrives call, see get_logical_drive_mask
+        self._drive_mask_cache = (0, 0.0)
+
+        # Long-lived PowerShell process shared by run_powershell (started lazily)
+        self._ps_process = None
+        self._ps_output = None
+        self._ps_lock = threading.Lock()
+
+        # restic.exe location, resolved once so each download_restic call doesn't rebuild it
+        self._restic_exe = Path("restic", "restic.exe").resolve()
+        # ((size, mtime_ns), "restic version" output) of the last verified restic.exe
+        self._restic_verified = None
+        # Serializes download_restic, which several worker threads may call at once
+        self._restic_lock = threading.Lock()
+        # (monotonic time, result) of the last check_audit_mode registry read
+        self._audit_mode_cache = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # Determine workflow mode and initialize appropriate database
         workflow_mode = self.detect_workflow_mode()
         
@@ -634,6 +1041,8 @@ class WindowsImagePrepGUI:
         # Style
         self.style = ttk.Style(self.root)
         self.style.theme_use('vista')
+        self.style.configure('Current.TButton', foreground='white', background='blue')
+        self.style.configure('Completed.TButton', foreground='white', background='green')
         
         # Current step tracking
         self.current_step = 1
@@ -651,8 +1060,10 @@ class WindowsImagePrepGUI:
         # Create main mode selection screen
         self.create_mode_selection_screen()
         
-        # Initialize mode frames (created but hidden)
+        # Initialize mode frames (built on first entry, hidden and re-shown afterwards)
         self.mode_frames = {}
+        # Mode -> the repo_type_var its UI was built with, restored when the mode is re-entered
+        self.mode_repo_type_vars = {}
         
         # Initialize step frames for legacy compatibility
         self.step_frames = {}
@@ -665,14 +1076,26 @@ class WindowsImagePrepGUI:
         self.next_button = None
         self.current_step_label = None
         
+        # VHDX/gptgen paths are shared by every frame that shows them; entries bind to these
+        # rather than each frame creating (and clobbering) its own variable
+        self.vhdx_path_var = tk.StringVar()
+        # gptgen lives next to this application
+        self.gptgen_path_var = tk.StringVar(value=str(_APP_DIR / "gptgen.exe"))
+        
         # --- Log Area (shared across all modes) ---
         log_frame = ttk.LabelFrame(self.root, text="Process Log", padding="5")
         log_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         self.log_area = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, state='disabled', bg="#f0f0f0", height=8)
         self.log_area.pack(fill="both", expand=True)
+        # Severity tags are configured once; _drain_log just references them
+        for name, color in (('err', '#b00'), ('warn', '#a60'), ('ok', '#080')):
+            self.log_area.tag_configure(name, foreground=color)
+        self.root.after(50, self._drain_log)
         
         # --- Initial Checks ---
-        self.check_admin()
+        if not self.check_admin():
+            # The window has already been destroyed
+            return
         
         # --- Welcome Message for Mode-Based Interface ---
         self.log("=== Windows Image Preparation Tool - Mode-Based Interface ===")
@@ -1350,11 +1773,12 @@ Updated: {image_data['updated_at']}"""
         max_free = 0
         largest_drive = "C:\\"
         
-        for drive in string.ascii_uppercase:
+        drive_mask = self.get_logical_drive_mask()
+        for bit, drive in enumerate(string.ascii_uppercase):
             drive_path = f"{drive}:\\"
-            if Path(drive_path).exists():
+            if (drive_mask >> bit) & 1:
                 try:
-                    free_space = shutil.disk_usage(drive_path).free
+                    free_space = cached_disk_usage(drive_path).free
                     if free_space > max_free:
                         max_free = free_space
                         largest_drive = drive_path
@@ -2052,29 +2476,20 @@ Updated: {image_data['updated_at']}"""
         
         self.step_labels = {}
         self.step_buttons = {}
-        step_names = [
-            "Create System Backup",
-            "Professional Image & VM Management", 
-            "Generalize & Cleanup"
-        ]
         
-        for i, step_name in enumerate(step_names, 1):
-            # Step frame with clickable button
-            step_frame = ttk.Frame(steps_frame)
-            step_frame.pack(side="left", fill="x", expand=True, padx=2)
-            
-            # Clickable step button
+        for i, step_name in enumerate(self.STEP_NAMES, 1):
+            # Clickable step button, centred in an equal share of the row
             step_text = f"{i}. {step_name}"
-            self.step_buttons[i] = ttk.Button(step_frame, text=step_text, 
-                                            command=lambda step=i: self.show_step(step),
+            self.step_buttons[i] = ttk.Button(steps_frame, text=step_text, 
+                                            command=partial(self.show_step, i),
                                             width=20)
-            self.step_buttons[i].pack(pady=2)
+            self.step_buttons[i].pack(side="left", expand=True, padx=2, pady=2)
             
             # Store reference for styling updates
             self.step_labels[i] = self.step_buttons[i]
         
         # Current step indicator
-        self.current_step_label = ttk.Label(header_frame, text="Current Step: 1 - Create System Backup", 
+        self.current_step_label = ttk.Label(header_frame, text=f"Current Step: 1 - {self.STEP_NAME_BY_NUM[1]}", 
                                           font=("TkDefaultFont", 11, "bold"), foreground="blue")
         self.current_step_label.pack(pady=(10, 0))
         
@@ -2114,7 +2529,7 @@ Updated: {image_data['updated_at']}"""
         
         for i in range(1, self.total_steps + 1):
             btn = ttk.Button(center_frame, text=f"Step {i}", width=8, 
-                           command=lambda step=i: self.show_step(step))
+                           command=partial(self.show_step, i))
             btn.pack(side="left", padx=2)
             
         # Add keyboard shortcut info
@@ -2123,17 +2538,21 @@ Updated: {image_data['updated_at']}"""
 
     def setup_keyboard_shortcuts(self):
         """Sets up keyboard shortcuts for navigation."""
-        # Bind keyboard shortcuts
-        self.root.bind('<Control-Left>', lambda e: self.previous_step())
-        self.root.bind('<Control-Right>', lambda e: self.next_step())
-        
-        # Bind number keys for direct step access
-        for i in range(1, self.total_steps + 1):
-            self.root.bind(f'<Control-Key-{i}>', lambda e, step=i: self.show_step(step))
+        # One binding handles Ctrl+Left/Right and Ctrl+<step number>
+        self.root.bind('<Control-KeyPress>', self._on_ctrl_key)
         
         # Make sure the root window can receive focus for keyboard events
         self.root.focus_set()
 
+    def _on_ctrl_key(self, event):
+        """Dispatches Ctrl+key navigation shortcuts."""
+        if event.keysym == 'Left':
+            self.previous_step()
+        elif event.keysym == 'Right':
+            self.next_step()
+        elif event.keysym.isdigit() and 1 <= int(event.keysym) <= self.total_steps:
+            self.show_step(int(event.keysym))
+
     def create_mode_selection_screen(self):
         """Creates the main mode selection screen with 4 mode buttons"""
         # Create main mode selection frame
@@ -2220,6 +2639,12 @@ Updated: {image_data['updated_at']}"""
         # Create back button
         self.create_back_to_modes_button()
         
+        # Modes visited before keep their UI; just show it again
+        if mode in self.mode_frames:
+            self.repo_type_var = self.mode_repo_type_vars[mode]
+            self.mode_frames[mode].pack(fill="both", expand=True, padx=10, pady=5)
+            return
+        
         # Create mode-specific UI
         if mode == "develop_capture":
             self.create_develop_capture_ui()
@@ -2229,6 +2654,7 @@ Updated: {image_data['updated_at']}"""
             self.create_generalize_ui()
         elif mode == "manage_images":
             self.create_manage_images_ui()
+        self.mode_repo_type_vars[mode] = self.repo_type_var
     
     def create_back_to_modes_button(self):
         """Create a back button to return to mode selection"""
@@ -2246,13 +2672,14 @@ Updated: {image_data['updated_at']}"""
     
     def return_to_mode_selection(self):
         """Return to the main mode selection screen"""
-        # Hide current mode UI
+        # Hide current mode UI; the back bar is rebuilt for each mode, so drop it entirely
         if hasattr(self, 'back_frame'):
-            self.back_frame.pack_forget()
+            self.back_frame.destroy()
         
-        # Hide any mode frames
-        for frame in self.mode_frames.values():
-            frame.pack_forget()
+        # Hide the current mode's frame; other modes' frames are already hidden
+        current_frame = self.mode_frames.get(self.current_mode)
+        if current_frame is not None:
+            current_frame.pack_forget()
         
         # Show mode selection screen
         self.mode_selection_frame.pack(fill="both", expand=True, padx=20, pady=20)
@@ -3197,9 +3624,10 @@ Updated: {image_data['updated_at']}"""
 
     def show_step(self, step_number):
         """Shows the specified step and hides others."""
-        # Hide all step frames
-        for frame in self.step_frames.values():
-            frame.pack_forget()
+        # Only the current step's frame can be showing, so that's the only one to hide
+        current_frame = self.step_frames.get(self.current_step)
+        if current_frame is not None:
+            current_frame.pack_forget()
         
         # Show current step frame
         if step_number in self.step_frames:
@@ -3207,25 +3635,16 @@ Updated: {image_data['updated_at']}"""
             self.current_step = step_number
             
             # Update header
-            step_names = [
-                "Create System Backup",
-                "Professional Image & VM Management", 
-                "Generalize & Cleanup",
-                "Capture to WIM",
-                "Deploy WIM"
-            ]
             if self.current_step_label:
-                self.current_step_label.config(text=f"Current Step: {step_number} - {step_names[step_number-1]}")
+                self.current_step_label.config(text=f"Current Step: {step_number} - {self.STEP_NAME_BY_NUM[step_number]}")
             
             # Update step button styles
             for i, button in self.step_buttons.items():
                 if i == step_number:
                     # Current step - blue and bold
-                    self.style.configure(f'Current.TButton', foreground='white', background='blue')
                     button.config(style='Current.TButton')
                 elif i < step_number:
                     # Completed steps - green
-                    self.style.configure(f'Completed.TButton', foreground='white', background='green')
                     button.config(style='Completed.TButton')
                 else:
                     # Future steps - default style
@@ -3238,7 +3657,7 @@ Updated: {image_data['updated_at']}"""
                 self.next_button.config(state="normal" if step_number < self.total_steps else "disabled")
             
             # Log the navigation
-            self.log(f"INFO: Navigated to Step {step_number} - {step_names[step_number-1]}")
+            self.log(f"INFO: Navigated to Step {step_number} - {self.STEP_NAME_BY_NUM[step_number]}")
 
     def previous_step(self):
         """Navigate to previous step."""
@@ -3455,16 +3874,43 @@ Updated: {image_data['updated_at']}"""
         self.step2_log_text.insert(tk.END, "[INFO] Repository base path: " + str(self.get_restic_base_path()) + "\n")
         self.step2_log_text.insert(tk.END, "[INFO] Working VHDX directory: " + str(self.db.get_working_vhdx_directory()) + "\n\n")
         self.step2_log_text.see(tk.END)
+        self._step2_log = self.queued_text_logger(self.step2_log_text)
+
+    def queued_text_logger(self, text_widget):
+        """Returns a function that appends text to text_widget; safe to call from worker threads.
+        
+        Text is queued and inserted in one batch every 50 ms, and old lines are trimmed,
+        like the main log area.
+        """
+        pending = queue.SimpleQueue()
+        
+        def drain():
+            chunks = []
+            while True:
+                try:
+                    chunks.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if chunks:
+                    text_widget.insert(tk.END, "".join(chunks))
+                    line_count = int(text_widget.index('end-1c').split('.')[0])
+                    if line_count > 5000:
+                        text_widget.delete('1.0', f'{line_count - 4000}.0')
+                    text_widget.see(tk.END)
+                text_widget.after(50, drain)
+            except tk.TclError:
+                # Widget has been destroyed
+                pass
+        
+        text_widget.after(50, drain)
+        return pending.put
 
     def log_step2(self, message):
         """Log message to Step 2 log area"""
-        if hasattr(self, 'step2_log_text'):
+        if hasattr(self, '_step2_log'):
             timestamp = datetime.now().strftime("%H:%M:%S")
-            formatted_message = f"[{timestamp}] {message}\n"
-            
-            self.step2_log_text.insert(tk.END, formatted_message)
-            self.step2_log_text.see(tk.END)
-            self.step2_log_text.update()
+            self._step2_log(f"[{timestamp}] {message}\n")
         
         # Also log to main log
         self.log(message)
@@ -3473,15 +3919,16 @@ Updated: {image_data['updated_at']}"""
         """Populate the Create New Image tab"""
         frame = self.create_tab
         
+        # Section frames are packed together once everything inside them exists,
+        # so the tab is laid out in one pass instead of after every section
+        
         # Step description
         desc_frame = ttk.LabelFrame(frame, text="Create New Restic Repository", padding="10")
-        desc_frame.pack(fill="x", pady=(0, 10))
         ttk.Label(desc_frame, text="Create a new restic repository for client system backups and images", 
                  font=("TkDefaultFont", 9)).pack()
 
         # Client/Site Configuration
         client_frame = ttk.LabelFrame(frame, text="Client & Site Information", padding="10")
-        client_frame.pack(fill="x", pady=(0, 10))
         client_frame.columnconfigure(1, weight=1)
         
         # Client selection/creation
@@ -3521,7 +3968,6 @@ Updated: {image_data['updated_at']}"""
 
         # Repository Configuration
         config_frame = ttk.LabelFrame(frame, text="Repository Configuration", padding="10")
-        config_frame.pack(fill="x", pady=(0, 10))
         config_frame.columnconfigure(1, weight=1)
 
         # Repository Name (auto-generated from client)
@@ -3548,7 +3994,6 @@ Updated: {image_data['updated_at']}"""
         
         # Import existing repository option
         import_frame = ttk.LabelFrame(frame, text="Import Existing Repository", padding="10")
-        import_frame.pack(fill="x", pady=(0, 10))
         import_frame.columnconfigure(1, weight=1)
         
         self.import_existing_var = tk.BooleanVar()
@@ -3571,7 +4016,6 @@ Updated: {image_data['updated_at']}"""
 
         # VM Configuration
         vm_frame = ttk.LabelFrame(frame, text="Virtual Machine Configuration", padding="10")
-        vm_frame.pack(fill="x", pady=(0, 10))
         vm_frame.columnconfigure(1, weight=1)
         
         self.create_vm_var = tk.BooleanVar(value=True)
@@ -3589,6 +4033,9 @@ Updated: {image_data['updated_at']}"""
         # Action Button
         self.create_image_button = ttk.Button(frame, text="🚀 Create Professional Image & VM", 
                                             command=self.start_professional_image_creation)
+        
+        for section in (desc_frame, client_frame, config_frame, import_frame, vm_frame):
+            section.pack(fill="x", pady=(0, 10))
         self.create_image_button.pack(pady=20, fill="x")
         
         # Load initial data
@@ -3654,17 +4101,17 @@ Updated: {image_data['updated_at']}"""
         self.stats_labels = {}
         stats = ["Total Images", "Total VMs", "Total Clients", "Total Sites", "Storage Used"]
         
-        for i, stat in enumerate(stats):
+        for i, stat_name in enumerate(stats):
             col = i % 3
             row = i // 3
             
             stat_frame = ttk.Frame(stats_container)
             stat_frame.grid(row=row, column=col, padx=10, pady=5, sticky="w")
             
-            ttk.Label(stat_frame, text=f"{stat}:", font=("TkDefaultFont", 9, "bold")).pack(anchor="w")
+            ttk.Label(stat_frame, text=f"{stat_name}:", font=("TkDefaultFont", 9, "bold")).pack(anchor="w")
             label = ttk.Label(stat_frame, text="Loading...", font=("TkDefaultFont", 12))
             label.pack(anchor="w")
-            self.stats_labels[stat] = label
+            self.stats_labels[stat_name] = label
         
         # Recent activity
         activity_frame = ttk.LabelFrame(frame, text="Recent Activity", padding="10")
@@ -4106,13 +4553,12 @@ Updated: {image_data['updated_at']}"""
         cancel_btn = ttk.Button(button_frame, text="Cancel", state="disabled")  # We'll implement cancel later
         cancel_btn.pack(side="right", padx=(0, 10))
         
+        dialog_log = self.queued_text_logger(log_text)
+        
         def log_to_dialog(message):
             """Log message to the dialog"""
             timestamp = datetime.now().strftime("%H:%M:%S")
-            formatted_message = f"[{timestamp}] {message}\n"
-            log_text.insert(tk.END, formatted_message)
-            log_text.see(tk.END)
-            log_text.update()
+            dialog_log(f"[{timestamp}] {message}\n")
             # Also log to Step 2
             self.log_step2(message)
         
@@ -4200,10 +4646,10 @@ Updated: {image_data['updated_at']}"""
                 log_func(f"Copying: {item.name}")
                 try:
                     if item.is_dir():
-                        shutil.copytree(item, dest_repo / item.name)
+                        shutil.copytree(item, dest_repo / item.name, copy_function=copy_file_unbuffered)
                         log_func(f"✓ Copied directory: {item.name}")
                     else:
-                        shutil.copy2(item, dest_repo / item.name)
+                        copy_file_unbuffered(item, dest_repo / item.name)
                         log_func(f"✓ Copied file: {item.name}")
                     copied_count += 1
                 except Exception as e:
@@ -4231,9 +4677,10 @@ Updated: {image_data['updated_at']}"""
             
             log_func("Testing repository access...")
             check_cmd = [restic_exe, "snapshots", "--json"]
-            log_func(f"Running command: {' '.join(check_cmd)}")
+            log_func(f"Running command: {subprocess.list2cmdline(check_cmd)}")
             
-            result = subprocess.run(check_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            result = subprocess.run(check_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore',
+                                    timeout=_RESTIC_PROBE_TIMEOUT)
             
             log_func(f"Command return code: {result.returncode}")
             if result.stdout:
@@ -4380,9 +4827,9 @@ Updated: {image_data['updated_at']}"""
             self.log_step2("Copying repository files...")
             for item in Path(source_repo).iterdir():
                 if item.is_dir():
-                    shutil.copytree(item, dest_repo / item.name)
+                    shutil.copytree(item, dest_repo / item.name, copy_function=copy_file_unbuffered)
                 else:
-                    shutil.copy2(item, dest_repo / item.name)
+                    copy_file_unbuffered(item, dest_repo / item.name)
             self.log_step2("Repository files copied successfully")
             
             # Verify repository integrity
@@ -4402,7 +4849,8 @@ Updated: {image_data['updated_at']}"""
             os.environ['RESTIC_PASSWORD'] = password
             
             check_cmd = [restic_exe, "snapshots", "--json"]
-            result = subprocess.run(check_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            result = subprocess.run(check_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore',
+                                    timeout=_RESTIC_PROBE_TIMEOUT)
             
             if result.returncode != 0:
                 # Clean up on failure - remove all copied files from client directory
@@ -4740,7 +5188,7 @@ Updated: {image_data['updated_at']}"""
                     return False
                 shutil.rmtree(dest_repo)
             
-            shutil.copytree(source_repo, dest_repo)
+            shutil.copytree(source_repo, dest_repo, copy_function=copy_file_unbuffered)
             self.log("SUCCESS: Repository copied successfully")
             
             # Try to determine repository password (user will need to provide)
@@ -4881,23 +5329,19 @@ Updated: {image_data['updated_at']}"""
             self.log(f"ERROR: Failed to restore repository to VHDX: {e}")
             return None
             
+    def run_diskpart(self, script):
+        """Runs a diskpart script and returns the completed process."""
+        # Feed the script to diskpart on stdin rather than through a temp file
+        return subprocess.run(["diskpart"], input=script, capture_output=True,
+                              text=True, encoding='utf-8', errors='ignore')
+
     def create_vhdx_file(self, vhdx_path, size_gb):
         """Create a new VHDX file using diskpart"""
         try:
             diskpart_script = f'''
 create vdisk file="{vhdx_path}" maximum={size_gb * 1024} type=expandable
 '''
-            script_path = vhdx_path.parent / f"create_vhdx_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-            script_path.write_text(diskpart_script, encoding='utf-8')
-            
-            cmd = ["diskpart", "/s", str(script_path)]
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            # Clean up script file
-            try:
-                script_path.unlink()
-            except:
-                pass
+            result = self.run_diskpart(diskpart_script)
                 
             if result.returncode == 0:
                 self.log(f"SUCCESS: Created VHDX file: {vhdx_path}")
@@ -4927,17 +5371,7 @@ format quick fs=ntfs label="Windows"
 active
 detach vdisk
 '''
-            script_path = vhdx_path.parent / f"init_vhdx_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-            script_path.write_text(diskpart_script, encoding='utf-8')
-            
-            cmd = ["diskpart", "/s", str(script_path)]
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            # Clean up script file
-            try:
-                script_path.unlink()
-            except:
-                pass
+            result = self.run_diskpart(diskpart_script)
                 
             if result.returncode == 0:
                 self.log("SUCCESS: VHDX initialized with GPT partitioning")
@@ -4958,17 +5392,7 @@ select vdisk file="{vhdx_path}"
 attach vdisk
 list partition
 '''
-            script_path = vhdx_path.parent / f"mount_vhdx_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-            script_path.write_text(diskpart_script, encoding='utf-8')
-            
-            cmd = ["diskpart", "/s", str(script_path)]
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            # Clean up script file
-            try:
-                script_path.unlink()
-            except:
-                pass
+            result = self.run_diskpart(diskpart_script)
                 
             if result.returncode == 0:
                 # Try to find the mounted Windows partition
@@ -4995,17 +5419,7 @@ list partition
 select vdisk file="{vhdx_path}"
 detach vdisk
 '''
-            script_path = vhdx_path.parent / f"unmount_vhdx_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-            script_path.write_text(diskpart_script, encoding='utf-8')
-            
-            cmd = ["diskpart", "/s", str(script_path)]
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            # Clean up script file
-            try:
-                script_path.unlink()
-            except:
-                pass
+            result = self.run_diskpart(diskpart_script)
                 
             if result.returncode == 0:
                 self.log("SUCCESS: VHDX unmounted")
@@ -5059,24 +5473,19 @@ detach vdisk
                 "--verbose"
             ]
             
-            self.log(f"COMMAND: {' '.join(restore_cmd)}")
+            self.log(f"COMMAND: {subprocess.list2cmdline(restore_cmd)}")
             self.log("INFO: Starting restic restore - this may take 10-30 minutes...")
             
             restore_proc = subprocess.Popen(
                 restore_cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                encoding='utf-8',
-                errors='ignore'
+                bufsize=1 << 16
             )
             
-            # Stream restore output
+            # Stream restore output in bulk reads
             if restore_proc.stdout:
-                for line in iter(restore_proc.stdout.readline, ''):
-                    line = line.strip()
-                    if line:
-                        self.log(line)
+                self.log_process_output(restore_proc.stdout)
             
             restore_proc.wait()
             
@@ -5151,7 +5560,6 @@ detach vdisk
             self.log("INFO: This would create a complete deployment-ready image")
             
             # Simulate work
-            import time
             time.sleep(3)
             
             self.log("SUCCESS: Professional image creation completed (placeholder)")
@@ -5999,7 +6407,7 @@ Updated: {repo_data[9]}"""
             # Copy repository
             self.log_step2("Copying repository files...")
             dest_repo.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copytree(source_path, dest_repo)
+            shutil.copytree(source_path, dest_repo, copy_function=copy_file_unbuffered)
             self.log_step2("Repository files copied successfully")
             
             # Verify repository is accessible
@@ -6013,7 +6421,8 @@ Updated: {repo_data[9]}"""
             os.environ['RESTIC_PASSWORD'] = password
             
             check_cmd = [restic_exe, "snapshots", "--json"]
-            result = subprocess.run(check_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            result = subprocess.run(check_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore',
+                                    timeout=_RESTIC_PROBE_TIMEOUT)
             
             if result.returncode != 0:
                 # Clean up copied files on failure
@@ -6252,7 +6661,8 @@ Updated: {repo_data[9]}"""
             # Get all snapshots with tags
             self.log_step2("Querying repository snapshots...")
             snapshots_cmd = [restic_exe, "snapshots", "--json"]
-            result = subprocess.run(snapshots_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            result = subprocess.run(snapshots_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore',
+                                    timeout=_RESTIC_PROBE_TIMEOUT)
             
             if result.returncode != 0:
                 raise Exception(f"Failed to query snapshots: {result.stderr}")
@@ -6706,7 +7116,6 @@ Updated: {repo_data[9]}"""
         
         # VHDX Path
         ttk.Label(config_frame, text="VHDX Path:").grid(row=0, column=0, sticky="w", pady=2)
-        self.vhdx_path_var = tk.StringVar()
         self.vhdx_path_entry = ttk.Entry(config_frame, textvariable=self.vhdx_path_var)
         self.vhdx_path_entry.grid(row=0, column=1, sticky="we", padx=5)
         self.vhdx_browse_button = ttk.Button(config_frame, text="Browse...", command=self.browse_vhdx_file)
@@ -6714,7 +7123,6 @@ Updated: {repo_data[9]}"""
         
         # gptgen Path
         ttk.Label(config_frame, text="gptgen Path:").grid(row=1, column=0, sticky="w", pady=2)
-        self.gptgen_path_var = tk.StringVar(value=str(Path("./gptgen.exe").resolve()))
         self.gptgen_entry = ttk.Entry(config_frame, textvariable=self.gptgen_path_var, state='readonly')
         self.gptgen_entry.grid(row=1, column=1, sticky="we", padx=5)
         self.gptgen_find_button = ttk.Button(config_frame, text="Help Me Find It", command=self.open_gptgen_download_page)
@@ -6753,17 +7161,124 @@ Updated: {repo_data[9]}"""
 
     def log(self, message):
         """Appends a message to the log area in a thread-safe way."""
-        def _append():
-            self.log_area.config(state='normal')
-            self.log_area.insert(tk.END, message + "\n")
-            self.log_area.config(state='disabled')
-            self.log_area.see(tk.END)
-        self.root.after(0, _append)
+        self._log_queue.append(message)
+
+    def log_batch(self, messages):
+        """Appends several messages to the log area as one queued entry."""
+        if messages:
+            self._log_queue.append("\n".join(messages))
+
+    def show_error_from_worker(self, title, message):
+        """Queues an error dialog to be shown by the Tk thread; safe to call from worker threads."""
+        self._dialog_queue.append((title, message))
+
+    def log_process_output(self, stream, prefix=""):
+        """Logs a binary process stream in bulk: one read1() of up to 64 KiB, one decode, one log_batch."""
+        pending = b''
+        while True:
+            chunk = stream.read1(65536)
+            if not chunk:
+                break
+            # Decode all complete lines in the chunk at once; keep the partial tail as bytes
+            complete, _, pending = (pending + chunk).rpartition(b'\n')
+            decoded = (line.strip() for line in complete.decode('utf-8', 'ignore').split('\n'))
+            self.log_batch([prefix + line for line in decoded if line])
+        last_line = pending.decode('utf-8', 'ignore').strip()
+        if last_line:
+            self.log(prefix + last_line)
+
+    def run_streaming(self, cmd, log_func):
+        """Runs a command, passing its output to log_func as it arrives. Returns the exit code."""
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            creationflags=subprocess.CREATE_NO_WINDOW,
+            bufsize=1 << 16
+        )
+        pending = b''
+        while True:
+            chunk = process.stdout.read1(65536)
+            if not chunk:
+                break
+            complete, _, pending = (pending + chunk).rpartition(b'\n')
+            decoded = (line.rstrip() for line in complete.decode('utf-8', 'ignore').split('\n'))
+            output = [line for line in decoded if line]
+            if output:
+                log_func("\n".join(output))
+        last_line = pending.decode('utf-8', 'ignore').strip()
+        if last_line:
+            log_func(last_line)
+        return process.wait()
+
+    def _log_tag(self, message):
+        """Returns the log area tag for a message based on its severity prefix."""
+        head = message.lstrip("- ")
+        if head.startswith(("ERROR", "FATAL")):
+            return 'err'
+        if head.startswith("WARN"):
+            return 'warn'
+        if head.startswith("SUCCESS"):
+            return 'ok'
+        return ''
+
+    def _drain_log(self):
+        """Flushes queued log messages to the log area in a single insert."""
+        try:
+            # Nothing to look at while the window is minimized; let messages accumulate
+            # and flush them in one go once it is restored
+            if not self.log_area.winfo_viewable():
+                self.root.after(500, self._drain_log)
+                return
+        except tk.TclError:
+            # Main window has been destroyed
+            return
+        # Cap each batch so a burst of output can't hold the Tk thread for long
+        messages = []
+        while len(messages) < 500:
+            try:
+                messages.append(self._log_queue.popleft())
+            except IndexError:
+                break
+        dialogs = []
+        while True:
+            try:
+                dialogs.append(self._dialog_queue.popleft())
+            except IndexError:
+                break
+        try:
+            if messages:
+                self.log_area.config(state='normal')
+                # Batched entries hold several lines, so severity is judged per line.
+                # Adjacent lines of the same severity share one text/tag pair, and all
+                # pairs go to Tk in a single insert call
+                lines = [line for message in messages for line in message.split("\n")]
+                insert_args = []
+                for tag, group in itertools.groupby(lines, key=self._log_tag):
+                    insert_args += ["\n".join(group) + "\n", tag]
+                self.log_area.insert(tk.END, *insert_args)
+                # Keep the widget bounded so inserts stay cheap during long captures
+                line_count = int(self.log_area.index('end-1c').split('.')[0])
+                if line_count > 5000:
+                    self.log_area.delete('1.0', f'{line_count - 4000}.0')
+                self.log_area.config(state='disabled')
+                self.log_area.see(tk.END)
+            # Come straight back if the batch was capped and messages are still waiting,
+            # and poll less often while the log is idle
+            batch_size = len(messages)
+            self.root.after(1 if batch_size == 500 else 50 if batch_size or dialogs else 100, self._drain_log)
+            # Re-armed first, so logging keeps flowing while a modal dialog is open
+            for title, message in dialogs:
+                messagebox.showerror(title, message)
+        except tk.TclError:
+            # Main window has been destroyed
+            pass
 
     def check_admin(self):
         """Check for admin rights and log the result."""
         try:
-            is_admin = ctypes.windll.shell32.IsUserAnAdmin()
+            is_admin = is_user_admin()
         except Exception as e:
             self.log(f"Admin check failed: {e}")
             is_admin = False
@@ -6803,19 +7318,7 @@ Updated: {repo_data[9]}"""
         url = "https://sourceforge.net/projects/gptgen/"
         self.log(f"INFO: Opening web browser to {url} for gptgen.")
         self.log("INFO: Please download the tool, extract it, and place 'gptgen.exe' in the same folder as this application.")
-        webbrowser.open(url)
-
-    def get_available_space(self, path):
-        """Get available disk space in bytes for the given path."""
-        return shutil.disk_usage(path).free
-
-    def get_drive_size(self, drive_letter):
-        """Get total size of a drive in bytes."""
-        if not drive_letter.endswith(':'):
-            drive_letter += ':'
-        if not drive_letter.endswith('\\'):
-            drive_letter += '\\'
-        return shutil.disk_usage(drive_letter).total
+        os.startfile(url)
 
     def install_to_public_desktop(self):
         """Copies this program to the Public Desktop as OIP.exe for easy access."""
@@ -6849,14 +7352,17 @@ Updated: {repo_data[9]}"""
                 messagebox.showerror("Installation Failed", f"Public Desktop folder not found:\n{public_desktop}")
                 return False
             
-            # Check if file already exists
-            if destination.exists():
+            # Check if file already exists (lexists is a single lstat)
+            if os.path.lexists(destination):
                 if not messagebox.askyesno("File Exists", 
                     f"OIP.exe already exists on the Public Desktop.\n\nOverwrite it?"):
                     return False
                 try:
-                    destination.unlink()
+                    os.remove(destination)
                     self.log("INFO: Removed existing OIP.exe")
+                except FileNotFoundError:
+                    # Already gone while the prompt was open
+                    pass
                 except Exception as e:
                     self.log(f"ERROR: Could not remove existing file: {e}")
                     messagebox.showerror("Installation Failed", f"Could not remove existing file:\n{e}")
@@ -6864,8 +7370,7 @@ Updated: {repo_data[9]}"""
             
             # Copy the executable
             self.log("INFO: Copying executable to Public Desktop...")
-            import shutil
-            shutil.copy2(current_exe, destination)
+            copy_file_unbuffered(current_exe, destination)
             
             # Verify the copy was successful
             if destination.exists():
@@ -6885,13 +7390,27 @@ Updated: {repo_data[9]}"""
             messagebox.showerror("Installation Failed", f"Could not install to Public Desktop:\n{e}")
             return False
 
-    def check_audit_mode(self):
-        """Check if Windows is currently in audit mode."""
+    def check_audit_mode(self, refresh=False):
+        """Check if Windows is currently in audit mode.
+        
+        The answer is cached for a few seconds, since the status panel and the
+        generalize worker can ask back to back. Pass refresh=True to force a registry read.
+        """
+        if not refresh and self._audit_mode_cache and time.monotonic() - self._audit_mode_cache[0] < 5:
+            return self._audit_mode_cache[1]
+        is_audit_mode = self._read_audit_mode()
+        self._audit_mode_cache = (time.monotonic(), is_audit_mode)
+        return is_audit_mode
+
+    def _read_audit_mode(self):
+        """Reads the audit mode state from the registry; see check_audit_mode."""
+        # Always read the 64-bit view, so a 32-bit Python isn't redirected to WOW6432Node
+        access = winreg.KEY_READ | winreg.KEY_WOW64_64KEY
         try:
             # Check the Setup State registry key
             try:
                 with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, 
-                                  r"SOFTWARE\Microsoft\Windows\CurrentVersion\Setup\State") as key:
+                                  r"SOFTWARE\Microsoft\Windows\CurrentVersion\Setup\State", 0, access) as key:
                     image_state, _ = winreg.QueryValueEx(key, "ImageState")
                     self.log(f"INFO: Windows ImageState: {image_state}")
                     
@@ -6907,7 +7426,7 @@ Updated: {repo_data[9]}"""
             # Fallback: Check for audit mode specific registry entries
             try:
                 with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
-                                  r"SYSTEM\Setup\Status") as key:
+                                  r"SYSTEM\Setup\Status", 0, access) as key:
                     try:
                         audit_boot, _ = winreg.QueryValueEx(key, "AuditBoot")
                         return audit_boot == 1
@@ -6924,99 +7443,62 @@ Updated: {repo_data[9]}"""
             return False
 
     def show_audit_mode_warning(self):
-        """Show comprehensive warning about not being in audit mode."""
-        warning_text = """⚠️  CRITICAL WARNING: NOT IN AUDIT MODE  ⚠️
-
-You are about to run Sysprep Generalize on a system that is NOT in Audit Mode.
-
-🔥 THIS IS EXTREMELY DANGEROUS AND WILL:
-   • Remove all user accounts and profiles (except built-in accounts)
-   • Delete user data and personalization
-   • Reset Windows activation
-   • Make the system non-bootable for current users
-   • Require complete reconfiguration after reboot
-
-📋 AUDIT MODE is the SAFE way to prepare images:
-   • Boot to audit mode: Ctrl+Shift+F3 during OOBE
-   • Or run: sysprep /audit /reboot
-   • Then run this generalization tool
-
-🛡️  RECOMMENDED ACTIONS:
-   1. STOP NOW and reboot to audit mode first
-   2. Or ensure this is a disposable test system
-   3. Or create a full system backup before continuing
-
-⚠️  DO NOT CONTINUE ON PRODUCTION SYSTEMS  ⚠️
-
-Are you absolutely certain you want to proceed?
-This action cannot be undone!"""
-
-        # Create a custom dialog with more prominent warning
-        import tkinter as tk
-        from tkinter import messagebox
+        """Show comprehensive warning about not being in audit mode.
         
-        result = messagebox.askyesno(
-            "🔥 CRITICAL WARNING - NOT IN AUDIT MODE 🔥",
-            warning_text,
-            icon='warning',
-            default='no'
-        )
+        The warning and the typed confirmation share one modal dialog; returns True only
+        if the user acknowledged the warning and typed the confirmation phrase.
+        """
+        dialog = tk.Toplevel(self.root)
+        dialog.title("🔥 CRITICAL WARNING - NOT IN AUDIT MODE 🔥")
+        dialog.transient(self.root)
+        dialog.grab_set()
         
-        if result:
-            # Double confirmation for extra safety
-            final_warning = """FINAL CONFIRMATION REQUIRED
-
-You have chosen to proceed despite the audit mode warning.
-
-This will PERMANENTLY ALTER your Windows installation.
-
-Type 'I UNDERSTAND THE RISK' below to confirm:"""
-            
-            # Create a simple input dialog
-            confirmation_window = tk.Toplevel(self.root)
-            confirmation_window.title("Final Confirmation Required")
-            confirmation_window.geometry("400x200")
-            confirmation_window.transient(self.root)
-            confirmation_window.grab_set()
-            
-            # Center the window
-            confirmation_window.update_idletasks()
-            x = (confirmation_window.winfo_screenwidth() // 2) - (confirmation_window.winfo_width() // 2)
-            y = (confirmation_window.winfo_screenheight() // 2) - (confirmation_window.winfo_height() // 2)
-            confirmation_window.geometry(f"+{x}+{y}")
-            
-            ttk.Label(confirmation_window, text=final_warning, wraplength=380).pack(pady=10, padx=10)
-            
-            entry_var = tk.StringVar()
-            entry = ttk.Entry(confirmation_window, textvariable=entry_var, width=30)
-            entry.pack(pady=10)
-            entry.focus()
-            
-            confirmed = [False]  # Use list to allow modification in nested function
-            
-            def check_confirmation():
-                if entry_var.get().strip().upper() == "I UNDERSTAND THE RISK":
-                    confirmed[0] = True
-                    confirmation_window.destroy()
-                else:
-                    messagebox.showerror("Incorrect Confirmation", "You must type exactly: I UNDERSTAND THE RISK")
-            
-            def cancel_confirmation():
-                confirmation_window.destroy()
-            
-            button_frame = ttk.Frame(confirmation_window)
-            button_frame.pack(pady=10)
-            
-            ttk.Button(button_frame, text="Confirm", command=check_confirmation).pack(side="left", padx=5)
-            ttk.Button(button_frame, text="Cancel (Recommended)", command=cancel_confirmation).pack(side="left", padx=5)
-            
-            # Bind Enter key to confirmation
-            entry.bind('<Return>', lambda e: check_confirmation())
-            
-            confirmation_window.wait_window()
-            return confirmed[0]
+        ttk.Label(dialog, text=_AUDIT_WARNING_TEXT, justify="left").pack(pady=10, padx=15)
         
-        return False
+        acknowledged_var = tk.BooleanVar()
+        ttk.Checkbutton(dialog, text="I have read the warning above", variable=acknowledged_var).pack(pady=5)
+        
+        ttk.Label(dialog, text=_AUDIT_FINAL_CONFIRMATION_TEXT, wraplength=380).pack(pady=10, padx=10)
+        
+        entry_var = tk.StringVar()
+        entry = ttk.Entry(dialog, textvariable=entry_var, width=30)
+        entry.pack(pady=5)
+        entry.focus()
+        
+        confirmed = [False]  # Use list to allow modification in nested function
+        
+        def is_confirmed():
+            return acknowledged_var.get() and entry_var.get().strip().upper() == "I UNDERSTAND THE RISK"
+        
+        def confirm():
+            if is_confirmed():
+                confirmed[0] = True
+                dialog.destroy()
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        
+        # Confirm only becomes clickable once the box is ticked and the phrase typed
+        confirm_button = ttk.Button(button_frame, text="Confirm", command=confirm, state="disabled")
+        confirm_button.pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Cancel (Recommended)", command=dialog.destroy).pack(side="left", padx=5)
+        
+        def update_confirm_state(*_):
+            confirm_button.config(state="normal" if is_confirmed() else "disabled")
+        
+        acknowledged_var.trace_add("write", update_confirm_state)
+        entry_var.trace_add("write", update_confirm_state)
+        entry.bind('<Return>', lambda e: confirm())
+        
+        # Center once Tk has sized the dialog, instead of forcing a geometry pass here
+        def center():
+            x = (dialog.winfo_screenwidth() - dialog.winfo_reqwidth()) // 2
+            y = (dialog.winfo_screenheight() - dialog.winfo_reqheight()) // 2
+            dialog.geometry(f"+{x}+{y}")
+        dialog.after(0, center)
+        
+        dialog.wait_window()
+        return confirmed[0]
 
     def update_audit_mode_status(self):
         """Updates the audit mode status label."""
@@ -7036,24 +7518,81 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
         self.log("ERROR: Legacy disk2vhd worker called - this functionality has been removed.")
         self.log("INFO: Please use the VSS+DISM method in Step 1 instead.")
 
-    def run_powershell(self, command, title):
-        """Runs a PowerShell command and logs the output."""
+    def get_powershell_session(self):
+        """Returns the long-lived PowerShell process, starting it if needed."""
+        if self._ps_process and self._ps_process.poll() is None:
+            return self._ps_process
+        
+        # "-Command -" keeps reading commands from stdin until it is closed
+        self._ps_process = subprocess.Popen(
+            _POWERSHELL + ["-Command", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            creationflags=subprocess.CREATE_NO_WINDOW,
+            bufsize=1 << 16
+        )
+        self._ps_process.stdin.write(
+            b"$ProgressPreference = 'SilentlyContinue'; [Console]::OutputEncoding = [System.Text.Encoding]::UTF8\n"
+        )
+        self._ps_process.stdin.flush()
+        
+        # stdout is pumped by a reader thread so _ps_exec can wait on it with a deadline;
+        # b'' marks the end of the stream
+        self._ps_output = queue.SimpleQueue()
+        
+        def pump(stream, output):
+            try:
+                while True:
+                    chunk = stream.read1(65536)
+                    output.put(chunk)
+                    if not chunk:
+                        break
+            except (OSError, ValueError):
+                output.put(b'')
+        
+        threading.Thread(target=pump, args=(self._ps_process.stdout, self._ps_output), daemon=True).start()
+        return self._ps_process
+
+    def warm_powershell_session(self):
+        """Starts the long-lived PowerShell process ahead of its first command."""
+        try:
+            with self._ps_lock:
+                self.get_powershell_session()
+        except Exception as e:
+            self.log(f"WARNING: Could not start PowerShell session: {e}")
+
+    def close_powershell_session(self):
+        """Shuts down the long-lived PowerShell process if it is running."""
+        process = self._ps_process
+        self._ps_process = None
+        if not process or process.poll() is not None:
+            return
+        try:
+            process.stdin.write(b"exit\n")
+            process.stdin.flush()
+            process.wait(timeout=5)
+        except Exception:
+            process.kill()
+
+    def on_close(self):
+        """Cleans up background processes before closing the main window."""
+        self.close_powershell_session()
+        self.root.destroy()
+
+    def run_powershell_process(self, command, title):
+        """Runs a PowerShell command in its own process and logs the output."""
         self.log(f"--- Running: {title} ---")
         try:
             full_command = f"$ProgressPreference = 'SilentlyContinue'; {command}"
             process = subprocess.Popen(
-                ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", full_command],
+                _POWERSHELL + ["-Command", full_command],
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                encoding='utf-8',
-                errors='ignore',
-                creationflags=subprocess.CREATE_NO_WINDOW
+                creationflags=subprocess.CREATE_NO_WINDOW,
+                bufsize=1 << 16
             )
-            if process.stdout:
-                for line in iter(process.stdout.readline, ''):
-                    if line.strip():
-                        self.log(line.strip())
+            self.log_process_output(process.stdout)
             process.wait()
             if process.returncode == 0:
                 self.log(f"--- SUCCESS: {title} completed. ---")
@@ -7065,12 +7604,107 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
             self.log(f"--- FATAL ERROR in {title}: {e} ---")
             return False
 
-    def start_generalization_thread(self):
-        """Starts the generalization process in a new thread."""
+    def _ps_exec(self, command, handle_output, timeout=None):
+        """Runs a command in the shared PowerShell session.
         
-        # First, check if we're in audit mode
-        self.log("INFO: Checking if Windows is in Audit Mode...")
-        is_audit_mode = self.check_audit_mode()
+        Output lines are passed to handle_output in batches. Returns whether the
+        command succeeded, or None if the session exited before finishing it. If the
+        command runs longer than timeout seconds the session is killed (a fresh one is
+        started by the next caller) and None is returned.
+        """
+        with self._ps_lock:
+            process = self.get_powershell_session()
+            output_queue = self._ps_output
+            
+            # Send the command as a single line so multi-line scripts are not split
+            # by the interactive parser, then print a sentinel with the result
+            sentinel = f"__END_{uuid.uuid4().hex}__"
+            encoded = base64.b64encode(command.encode('utf-8')).decode('ascii')
+            process.stdin.write((
+                "$__ok = $true; try { "
+                f"& ([scriptblock]::Create([System.Text.Encoding]::UTF8.GetString([System.Convert]::FromBase64String('{encoded}')))); "
+                "$__ok = $? } catch { Write-Output $_; $__ok = $false }; "
+                f"Write-Output \"{sentinel}:$__ok\"\n"
+            ).encode('utf-8'))
+            process.stdin.flush()
+            
+            # Read raw chunks and only decode complete lines
+            sentinel_bytes = sentinel.encode('ascii')
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            success = None
+            pending = b''
+            while success is None:
+                try:
+                    chunk = output_queue.get(
+                        timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self.log(f"WARNING: PowerShell command timed out after {timeout}s; restarting the session")
+                    process.kill()
+                    break
+                if not chunk:
+                    break
+                *lines, pending = (pending + chunk).split(b'\n')
+                output = []
+                for line in lines:
+                    line = line.strip()
+                    if line.startswith(sentinel_bytes):
+                        success = line.endswith(b":True")
+                        break
+                    if line:
+                        output.append(line.decode('utf-8', 'ignore'))
+                handle_output(output)
+            
+            if success is None:
+                # The session died mid-command; a fresh one is started next time
+                self._ps_process = None
+            return success
+
+    def query_powershell(self, command, timeout=None):
+        """Runs a command in the shared PowerShell session and returns (success, output).
+        
+        Pass timeout (seconds) for queries that could hang, e.g. WMI; see _ps_exec.
+        """
+        output = []
+        success = self._ps_exec(command, output.extend, timeout)
+        return bool(success), "\n".join(output)
+
+    def run_powershell(self, command, title, persistent=True):
+        """Runs a PowerShell command in the shared session and logs the output.
+        
+        Pass persistent=False to use a separate process, so the command can run
+        concurrently with others.
+        """
+        if not persistent:
+            return self.run_powershell_process(command, title)
+        
+        self.log(f"--- Running: {title} ---")
+        try:
+            success = self._ps_exec(command, self.log_batch)
+            if success is None:
+                self.log(f"--- ERROR: {title} failed, PowerShell session exited unexpectedly. ---")
+                return False
+            if success:
+                self.log(f"--- SUCCESS: {title} completed. ---")
+                return True
+            else:
+                self.log(f"--- ERROR: {title} failed. ---")
+                return False
+        except Exception as e:
+            self.log(f"--- FATAL ERROR in {title}: {e} ---")
+            return False
+
+    def start_generalization_thread(self):
+        """Starts the generalization process in a new thread."""
+        
+        # Start the shared PowerShell session now so its startup overlaps the checks and
+        # confirmation dialogs below instead of delaying STEP 1. It is started from a
+        # background thread since _ps_lock may be held by a running query
+        threading.Thread(target=self.warm_powershell_session, daemon=True).start()
+        
+        # First, check if we're in audit mode
+        self.log("INFO: Checking if Windows is in Audit Mode...")
+        # Sysprep is about to be gated on this, so always read the registry afresh
+        is_audit_mode = self.check_audit_mode(refresh=True)
         
         if is_audit_mode:
             self.log("SUCCESS: System is in Audit Mode - safe to proceed with generalization.")
@@ -7101,154 +7735,65 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
             # Replicating the main execution block from the PowerShell script
             self.log("INFO: Starting Windows Image Preparation...")
 
+            # STEP 1 (user profiles) doesn't depend on the other steps, so it runs in its own
+            # PowerShell process alongside them. The rest keep their order: uninstallers
+            # (STEP 2) must run before their agent data is deleted (STEP 3), and the event
+            # logs (STEP 5) are cleared last so nothing the other steps write stays behind
+
             # STEP 1: Remove User Accounts and Profiles
+            user_cleanup = None
             if not self.skip_user_cleanup_var.get():
-                self.run_powershell(
+                user_cleanup = threading.Thread(target=self.run_powershell, kwargs=dict(
                     title="STEP 1: Remove User Accounts and Profiles",
-                    command="""
-                        $currentUser = ([System.Security.Principal.WindowsIdentity]::GetCurrent().Name).Split('\\')[-1]
-                        $systemAccounts = @('Administrator','DefaultAccount','Guest','WDAGUtilityAccount', $currentUser)
-                        $systemProfiles = @('Administrator','DefaultAccount','Guest','WDAGUtilityAccount','Public', $currentUser)
-                        
-                        Write-Host "--- Removing local user accounts ---"
-                        Get-LocalUser | Where-Object { $_.Name -notin $systemAccounts } | ForEach-Object {
-                            Write-Host "Removing user: $($_.Name)"
-                            try { Remove-LocalUser -Name $_.Name -ErrorAction Stop } catch { Write-Warning $_.Exception.Message }
-                        }
-                        
-                        Write-Host "--- Removing local user profiles ---"
-                        Get-ChildItem -Path 'C:\\Users' -Directory | Where-Object { $_.Name -notin $systemProfiles } | ForEach-Object {
-                            $folder = $_
-                            Write-Host "Removing profile folder: $($folder.FullName)"
-                            try {
-                                $profile = Get-CimInstance Win32_UserProfile | Where-Object { $_.LocalPath -eq $folder.FullName }
-                                if ($profile) {
-                                    Remove-CimInstance -InputObject $profile -ErrorAction SilentlyContinue
-                                    Write-Host "Removed registry entry for: $($folder.Name)"
-                                }
-                                Remove-Item -Path $folder.FullName -Recurse -Force -ErrorAction Stop
-                            } catch {
-                                Write-Warning "Failed to remove profile '$($folder.Name)': $($_.Exception.Message)"
-                            }
-                        }
-                    """
-                )
+                    persistent=False,
+                    command=_STEP1_REMOVE_USERS_CMD
+                ))
+                user_cleanup.start()
             else:
                 self.log("INFO: Skipping User Cleanup as requested.")
 
             # STEP 2: Remove Problematic Applications
-            self.run_powershell(
-                title="STEP 2: Remove Problematic Applications",
-                command="""
-                    function Uninstall-App {
-                        param([string]$AppNamePattern)
-                        $regPaths = 'HKLM:\\SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\*', 'HKLM:\\SOFTWARE\\WOW6432Node\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\*'
-                        Get-ItemProperty $regPaths -ErrorAction SilentlyContinue | Where-Object { $_.DisplayName -like "*$AppNamePattern*" -and $_.UninstallString } | ForEach-Object {
-                            $app = $_
-                            Write-Host "Uninstalling: $($app.DisplayName)"
-                            if ($app.UninstallString -like "*msiexec*") {
-                                Start-Process "msiexec.exe" -ArgumentList "/x", $app.ProductCode, "/quiet", "/norestart" -Wait
-                            } else {
-                                $args = $app.UninstallString.Split(' ')
-                                $exe = $args[0]
-                                $rest = $args[1..($args.Length-1)] + "/S", "/silent", "/quiet"
-                                Start-Process $exe -ArgumentList $rest -Wait
-                            }
-                        }
-                    }
-                    Uninstall-App -AppNamePattern "Veeam"
-                    Uninstall-App -AppNamePattern "SnapAgent"
-                    Uninstall-App -AppNamePattern "Blackpoint"
-                """
-            )
+            # Runs on its own since uninstallers change installed-software state
+            self.remove_problematic_applications()
 
             # STEP 3: Clear Agent Identity Data
             if not self.skip_agent_cleanup_var.get():
                 self.run_powershell(
                     title="STEP 3: Clear Agent Identity Data",
-                    command="""
-                        try { Remove-ItemProperty -Path 'HKLM:\\SOFTWARE\\WOW6432Node\\NinjaRMM LLC\\NinjaRMMAgent\\Agent' -Name 'NodeId' -Force -ErrorAction Stop; Write-Host 'Removed NinjaRMM NodeId' } catch {}
-                        try { Remove-Item -Path 'HKLM:\\SOFTWARE\\Veeam' -Recurse -Force -ErrorAction Stop; Write-Host 'Removed Veeam registry key' } catch {}
-                        try { Remove-Item -Path 'C:\\ProgramData\\NinjaRMMAgent' -Recurse -Force -ErrorAction Stop; Write-Host 'Removed NinjaRMM data folder' } catch {}
-                        try { Remove-Item -Path 'C:\\ProgramData\\Veeam' -Recurse -Force -ErrorAction Stop; Write-Host 'Removed Veeam data folder' } catch {}
-                    """
+                    command=_STEP3_CLEAR_AGENT_DATA_CMD
                 )
             else:
                 self.log("INFO: Skipping Agent Cleanup as requested.")
-            
+
             # STEP 4: Disable BitLocker
             self.run_powershell(
                 title="STEP 4: Disable BitLocker",
-                command="""
-                    $encryptedVolumes = Get-BitLockerVolume | Where-Object { $_.VolumeStatus -ne 'FullyDecrypted' }
-                    if ($encryptedVolumes) {
-                        Write-Host "Disabling BitLocker on encrypted volumes..."
-                        $encryptedVolumes | ForEach-Object {
-                            Write-Host "Disabling on $($_.MountPoint)..."
-                            try { Disable-BitLocker -MountPoint $_.MountPoint -ErrorAction Stop } catch { Write-Warning "Failed to disable BitLocker on $($_.MountPoint): $($_.Exception.Message)" }
-                        }
-                        # Wait for decryption
-                        while ((Get-BitLockerVolume | Where-Object { $_.VolumeStatus -eq 'DecryptionInProgress' }).Count -gt 0) {
-                           Write-Host "Waiting for BitLocker decryption to complete..."
-                           Start-Sleep -Seconds 10
-                        }
-                        Write-Host "BitLocker decryption complete."
-                    } else {
-                        Write-Host "No encrypted BitLocker volumes found."
-                    }
-                """
+                command=_STEP4_DISABLE_BITLOCKER_CMD
             )
 
+            # STEP 1 reports its own result; wait for it so the logs are cleared after it
+            if user_cleanup is not None:
+                user_cleanup.join()
+
             # STEP 5: Clear Windows Logs
             if not self.skip_log_cleanup_var.get():
                 self.run_powershell(
                     title="STEP 5: Clear Windows Logs",
-                    command="""
-                        wevtutil.exe cl Application
-                        wevtutil.exe cl Security
-                        wevtutil.exe cl Setup
-                        wevtutil.exe cl System
-                        if (Test-Path "$env:SystemRoot\\Panther") { Remove-Item -Path "$env:SystemRoot\\Panther\\*" -Recurse -Force }
-                    """
+                    command=_STEP5_CLEAR_LOGS_CMD
                 )
             else:
                 self.log("INFO: Skipping Log Cleanup as requested.")
 
             # STEP 6: Create Unattend.xml
             self.log("INFO: STEP 6: Creating Unattend.xml for Sysprep...")
-            unattend_content = """<?xml version="1.0" encoding="utf-8"?>
-<unattend xmlns="urn:schemas-microsoft-com:unattend">
-    <settings pass="specialize">
-        <component name="Microsoft-Windows-Shell-Setup" processorArchitecture="amd64" publicKeyToken="31bf3856ad364e35" language="neutral" versionScope="nonSxS">
-            <CopyProfile>true</CopyProfile>
-            <UserAccounts>
-                <LocalAccounts>
-                    <LocalAccount wcm:action="add" xmlns:wcm="http://schemas.microsoft.com/WMIConfig/2002/State">
-                        <Name>installadmin</Name>
-                        <Group>Administrators</Group>
-                        <Password><Value>DTC@dental2025</Value><PlainText>true</PlainText></Password>
-                    </LocalAccount>
-                </LocalAccounts>
-            </UserAccounts>
-            <AutoLogon>
-                <Enabled>true</Enabled>
-                <Username>installadmin</Username>
-                <Password><Value>DTC@dental2025</Value><PlainText>true</PlainText></Password>
-            </AutoLogon>
-        </component>
-    </settings>
-    <settings pass="oobeSystem">
-        <component name="Microsoft-Windows-Shell-Setup" processorArchitecture="amd64" publicKeyToken="31bf3856ad364e35" language="neutral" versionScope="nonSxS">
-            <OOBE><HideEULAPage>true</HideEULAPage><HideLocalAccountScreen>true</HideLocalAccountScreen><HideOnlineAccountScreens>true</HideOnlineAccountScreens><HideWirelessSetupInOOBE>true</HideWirelessSetupInOOBE><ProtectYourPC>1</ProtectYourPC><SkipMachineOOBE>true</SkipMachineOOBE></OOBE>
-        </component>
-    </settings>
-</unattend>
-"""
-            sysprep_dir = Path("C:/Windows/System32/Sysprep")
-            unattend_path = sysprep_dir / "unattend.xml"
+            unattend_path = _SYSPREP_DIR / "unattend.xml"
             try:
-                with open(unattend_path, "w", encoding="utf-8") as f:
-                    f.write(unattend_content)
+                _SYSPREP_DIR.mkdir(parents=True, exist_ok=True)
+                # Write beside the target and rename over it, so a scanner or a failed write can
+                # never leave Sysprep a half-written unattend.xml
+                unattend_tmp = unattend_path.with_name(unattend_path.name + ".tmp")
+                unattend_tmp.write_bytes(_UNATTEND_XML)
+                os.replace(unattend_tmp, unattend_path)
                 self.log("SUCCESS: Created Unattend.xml")
             except Exception as e:
                 self.log(f"ERROR: Failed to create Unattend.xml: {e}")
@@ -7256,55 +7801,55 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
 
             # STEP 7: Run Sysprep Loop
             self.log("INFO: STEP 7: Starting Sysprep Generalization Loop...")
+            self.run_powershell(title="Removing per-user AppX packages before Sysprep", command=_PREFLIGHT_APPX_CLEANUP_CMD)
             max_attempts = 10
             for attempt in range(1, max_attempts + 1):
                 self.log(f"--- Sysprep Attempt #{attempt} of {max_attempts} ---")
                 
-                # Clear Panther logs before running
-                self.run_powershell(title="Clearing Sysprep Logs", command="if (Test-Path 'C:\\Windows\\System32\\Sysprep\\Panther') { Remove-Item -Path 'C:\\Windows\\System32\\Sysprep\\Panther\\*' -Recurse -Force }")
+                # Clear Panther logs before running; later attempts clear them as part of
+                # the blocker removal call
+                if attempt == 1:
+                    self.run_powershell(title="Clearing Sysprep Logs", command=_CLEAR_SYSPREP_PANTHER_CMD)
 
                 # Run Sysprep
                 sysprep_proc = subprocess.run([
-                    "C:\\Windows\\System32\\Sysprep\\sysprep.exe",
+                    str(_SYSPREP_DIR / "sysprep.exe"),
                     "/generalize", "/oobe", "/shutdown", f"/unattend:{unattend_path}"
-                ], capture_output=True, text=True)
+                ], capture_output=True)
 
                 # A successful run shuts down the PC, so if we're here, it failed.
                 self.log("WARNING: Sysprep process completed without shutting down, indicating a failure.")
-                time.sleep(5) # Give logs time to be written
+                # Give logs time to be written, but only until setuperr.log stops changing
+                self.wait_for_file_settled(_SYSPREP_DIR / "Panther" / "setuperr.log")
 
                 # Check for AppX blockers
-                blockers_result = subprocess.run(
-                    ["powershell", "-Command", "Get-Content 'C:\\Windows\\System32\\Sysprep\\Panther\\setuperr.log' -Raw | Select-String -Pattern 'SYSPRP Package (.*?) was installed for a user' -AllMatches | ForEach-Object { $_.Matches.Groups[1].Value }"],
-                    capture_output=True, text=True, encoding='utf-8', errors='ignore'
-                )
-                
-                blockers = list(set(blockers_result.stdout.strip().splitlines()))
+                try:
+                    log_data = (_SYSPREP_DIR / "Panther" / "setuperr.log").read_bytes()
+                    if log_data[:2] in (b'\xff\xfe', b'\xfe\xff'):
+                        log_data = log_data.decode('utf-16', errors='ignore').encode('utf-8')
+                    elif log_data[1:2] == b'\x00':
+                        # UTF-16-LE written without a BOM
+                        log_data = log_data.decode('utf-16-le', errors='ignore').encode('utf-8')
+                except OSError:
+                    log_data = b''
+                
+                # Ordered de-duplication, so blockers are removed in log order
+                blockers = list(dict.fromkeys(
+                    match.group(1).decode('utf-8', errors='ignore').strip()
+                    for match in _SYSPREP_BLOCKER_PATTERN.finditer(log_data)
+                ))
                 if not blockers:
                     self.log("ERROR: Sysprep failed, but no AppX blockers were found in the log. Manual investigation required.")
-                    self.log(f"Sysprep output:\n{sysprep_proc.stdout}\n{sysprep_proc.stderr}")
+                    sysprep_output = (sysprep_proc.stdout + b"\n" + sysprep_proc.stderr).decode('utf-8', 'replace')
+                    self.log(f"Sysprep output:\n{sysprep_output}")
                     break # Exit the loop
 
                 self.log(f"WARNING: Found {len(blockers)} potential AppX blockers.")
 
-                # Remove blockers
-                blocker_list_str = ", ".join([f"'{b}'" for b in blockers])
-                removal_command = f"""
-                    $blockersToRemove = @({blocker_list_str})
-                    $totalRemoved = 0
-                    foreach ($blocker in $blockersToRemove) {{
-                        $removed = $false
-                        Get-AppxPackage -AllUsers -Name "*$blocker*" | Remove-AppxPackage -AllUsers
-                        if ($?) {{ $removed = $true }}
-                        Get-AppxProvisionedPackage -Online | Where-Object {{ $_.PackageName -like "*$blocker*" }} | Remove-AppxProvisionedPackage -Online
-                        if ($?) {{ $removed = $true }}
-                        if ($removed) {{
-                             Write-Host "Removed blocker: $blocker"
-                             $totalRemoved++
-                        }}
-                    }}
-                    return $totalRemoved
-                """
+                # Remove blockers and clear the Panther logs for the next attempt in one call.
+                # The session sends commands base64-encoded, so the inline list needs no temp file
+                blocker_list = ", ".join("'" + blocker.replace("'", "''") + "'" for blocker in blockers)
+                removal_command = f"$blockersToRemove = @({blocker_list})\n" + _REMOVE_APPX_BLOCKERS_CMD
                 removal_success = self.run_powershell(title=f"Removing {len(blockers)} blockers", command=removal_command)
 
                 if not removal_success:
@@ -7322,12 +7867,94 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
         finally:
             self.generalize_button.config(state="normal")
 
+    def wait_for_file_settled(self, path, quiet=0.5, timeout=5.0):
+        """Waits until a file's size and mtime stop changing for `quiet` seconds, or `timeout` passes."""
+        start = time.monotonic()
+        last_state = None
+        last_change = start
+        while True:
+            now = time.monotonic()
+            if now - start >= timeout:
+                return
+            try:
+                st = path.stat()
+                state = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                state = None
+            if state != last_state:
+                last_state = state
+                last_change = now
+            elif state is not None and now - last_change >= quiet:
+                return
+            time.sleep(0.1)
+
+    def remove_problematic_applications(self):
+        """Uninstalls agents that break imaging (STEP 2), found via the registry uninstall keys."""
+        title = "STEP 2: Remove Problematic Applications"
+        self.log(f"--- Running: {title} ---")
+        try:
+            uninstall_paths = (
+                r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall",
+                r"SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\Uninstall",
+            )
+            
+            # Single pass over both uninstall keys; entries are matched on DisplayName before
+            # anything else is read from them
+            matches = []
+            for uninstall_path in uninstall_paths:
+                try:
+                    uninstall_key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, uninstall_path, 0,
+                                                   winreg.KEY_READ | winreg.KEY_WOW64_64KEY)
+                except OSError:
+                    continue
+                with uninstall_key:
+                    index = 0
+                    while True:
+                        try:
+                            subkey_name = winreg.EnumKey(uninstall_key, index)
+                        except OSError:
+                            break
+                        index += 1
+                        try:
+                            with winreg.OpenKey(uninstall_key, subkey_name) as app_key:
+                                display_name = winreg.QueryValueEx(app_key, "DisplayName")[0]
+                                if not _PROBLEM_APP_PATTERN.search(str(display_name)):
+                                    continue
+                                uninstall_string = winreg.QueryValueEx(app_key, "UninstallString")[0]
+                        except OSError:
+                            continue
+                        if uninstall_string:
+                            matches.append((display_name, subkey_name, uninstall_string))
+            
+            # Uninstall one at a time - concurrent MSI operations fail on the installer mutex
+            for display_name, product_code, uninstall_string in matches:
+                self.log(f"Uninstalling: {display_name}")
+                if "msiexec" in uninstall_string.lower():
+                    uninstall_cmd = ["msiexec.exe", "/x", product_code, "/quiet", "/norestart"]
+                else:
+                    quoted = re.match(r'\s*"([^"]+)"\s*(.*)', uninstall_string)
+                    if quoted:
+                        exe, rest = quoted.group(1), quoted.group(2)
+                    else:
+                        exe, _, rest = uninstall_string.partition(' ')
+                    uninstall_cmd = [exe] + rest.split() + ["/S", "/silent", "/quiet"]
+                try:
+                    subprocess.run(uninstall_cmd, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
+                except Exception as e:
+                    self.log(f"WARNING: Failed to uninstall {display_name}: {e}")
+            
+            self.log(f"--- SUCCESS: {title} completed. ---")
+            return True
+        except Exception as e:
+            self.log(f"--- FATAL ERROR in {title}: {e} ---")
+            return False
+
     # Note: Old VHDX processing methods removed - functionality replaced by new Step 2 professional image creation
 
     def start_wim_capture_thread(self):
         """Starts the WIM capture process in a new thread."""
         # Basic validation
-        if not hasattr(self, 'vhdx_path_var') or not self.vhdx_path_var.get():
+        if not self.vhdx_path_var.get():
             messagebox.showerror("Missing VHDX", "Please specify a VHDX file to capture from.")
             return
 
@@ -7402,9 +8029,8 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
         interfering_services = ["BackupExecVSSProvider", "VeeamVSSSupport", "VSS"]
         for service in interfering_services:
             try:
-                result = subprocess.run(["sc", "query", service], 
-                                      capture_output=True, text=True)
-                if "RUNNING" in result.stdout:
+                result = subprocess.run(["sc", "query", service], capture_output=True)
+                if b"RUNNING" in result.stdout:
                     self.log(f"INFO: Service {service} is running")
                     if service != "VSS":
                         self.log(f"WARNING: {service} may interfere with VSS")
@@ -7422,6 +8048,11 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                     if free_space < 50:
                         self.log("WARNING: Low disk space may cause backup to fail")
                         self.log("RECOMMENDATION: Free up disk space or configure S3 storage")
+                    
+                    # Repositories on an SMB share benefit from multichannel and large MTU
+                    restic_anchor = restic_base.anchor
+                    if restic_anchor.startswith("\\\\") or ctypes.windll.kernel32.GetDriveTypeW(restic_anchor) == 4:
+                        self.check_smb_client_configuration()
             except Exception as e:
                 self.log(f"WARNING: Could not check disk space: {e}")
         else:
@@ -7429,6 +8060,25 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
         
         self.log("INFO: VSS prerequisites check completed")
 
+    def check_smb_client_configuration(self):
+        """Log whether SMB multichannel and large MTU are enabled for a network repository."""
+        try:
+            result = subprocess.run(
+                _POWERSHELL_CORE + ["-Command",
+                 "$c = Get-SmbClientConfiguration; \"$($c.EnableMultiChannel) $($c.EnableLargeMtu)\""],
+                capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW
+            )
+            settings = result.stdout.decode('utf-8', 'replace').split()
+            if len(settings) != 2:
+                return
+            multichannel, large_mtu = settings
+            self.log(f"INFO: SMB client: multichannel={multichannel}, large MTU={large_mtu}")
+            if multichannel != "True" or large_mtu != "True":
+                self.log("RECOMMENDATION: Enable SMB multichannel and large MTU for faster repository writes:")
+                self.log("  Set-SmbClientConfiguration -EnableMultiChannel $true -EnableLargeMtu $true")
+        except Exception as e:
+            self.log(f"WARNING: Could not check SMB client configuration: {e}")
+
     def create_vss_wim_image(self):
         """Creates a WIM image using VSS shadow copy + DISM (safe approach)."""
         # This method is deprecated - use the modern restic backup workflow instead
@@ -7481,18 +8131,23 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                 $result = $volume.Create('{drive_letter}\\', 'ClientAccessible')
                 if ($result.ReturnValue -eq 0) {{
                     $shadowId = $result.ShadowID
-                    Write-Host "POWERSHELL_SUCCESS:$shadowId"
+                    # Look up the device path in the same process so get_vss_shadow_path needn't
+                    $shadow = Get-WmiObject Win32_ShadowCopy -Filter "ID='$shadowId'"
+                    Write-Host "POWERSHELL_SUCCESS:$shadowId|$($shadow.DeviceObject)"
                 }} else {{
                     Write-Host "POWERSHELL_ERROR:$($result.ReturnValue)"
                 }}
                 """
                 
-                ps_proc = subprocess.run([
-                    "powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", ps_cmd
-                ], capture_output=True, text=True, encoding='utf-8', errors='ignore')
+                ps_proc = subprocess.run(
+                    _POWERSHELL + ["-Command", ps_cmd],
+                    capture_output=True, text=True, encoding='utf-8', errors='ignore')
                 
                 if ps_proc.returncode == 0 and "POWERSHELL_SUCCESS:" in ps_proc.stdout:
-                    shadow_id = ps_proc.stdout.split("POWERSHELL_SUCCESS:")[1].strip()
+                    shadow_info = ps_proc.stdout.split("POWERSHELL_SUCCESS:")[1].strip()
+                    shadow_id, _, shadow_path = shadow_info.partition("|")
+                    if shadow_path:
+                        self._vss_shadow_paths[shadow_id] = shadow_path
                     self.log(f"SUCCESS: PowerShell created shadow copy with ID: {shadow_id}")
                     return shadow_id
                 else:
@@ -7504,7 +8159,7 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
             self.log("INFO: Falling back to vssadmin command...")
             vss_cmd = ["vssadmin", "create", "shadow", f"/for={drive_letter}\\"]
             
-            self.log(f"COMMAND: {' '.join(vss_cmd)}")
+            self.log(f"COMMAND: {subprocess.list2cmdline(vss_cmd)}")
             vss_proc = subprocess.run(vss_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
             
             # Log both stdout and stderr for debugging
@@ -7553,7 +8208,7 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                 for diag_cmd in diag_cmds:
                     try:
                         diag_proc = subprocess.run(diag_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                        self.log(f"DIAG {' '.join(diag_cmd)}: {diag_proc.stdout}")
+                        self.log(f"DIAG {subprocess.list2cmdline(diag_cmd)}: {diag_proc.stdout}")
                     except:
                         pass
                 
@@ -7564,8 +8219,7 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
             self.log("INFO: VSS command completed successfully, parsing shadow copy ID...")
             
             # Look for "Shadow Copy ID: {xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx}"
-            import re
-            shadow_id_match = re.search(r'Shadow Copy ID: \{([^}]+)\}', output)
+            shadow_id_match = _SHADOW_ID_PATTERN.search(output)
             if shadow_id_match:
                 shadow_id = shadow_id_match.group(1)
                 self.log(f"SUCCESS: Created shadow copy with ID: {shadow_id}")
@@ -7587,18 +8241,20 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
         """
         self.log(f"Attempting to get shadow path for ID: {shadow_id}")
 
+        # Already known if the shadow copy was created by create_vss_shadow_copy
+        shadow_path = self._vss_shadow_paths.get(shadow_id)
+        if shadow_path:
+            self.log(f"Using shadow path reported at creation: {shadow_path}")
+            return shadow_path
+
         # Method 1: PowerShell using WMI (most reliable)
         try:
             self.log("Trying to get shadow path using PowerShell (WMI)...")
             # This is more compatible across Windows versions than Get-VssShadow
             ps_command = f"(Get-WmiObject Win32_ShadowCopy -Filter \"ID='{shadow_id}'\").DeviceObject"
             
-            result = subprocess.run(
-                ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", ps_command],
-                capture_output=True, text=True, check=True, timeout=30, encoding='utf-8', errors='ignore'
-            )
-            
-            shadow_path = result.stdout.strip()
+            _, shadow_path = self.query_powershell(ps_command, timeout=30)
+            shadow_path = shadow_path.strip()
             if shadow_path and 'HarddiskVolumeShadowCopy' in shadow_path:
                 self.log(f"PowerShell successful. Found shadow path: {shadow_path}")
                 return shadow_path
@@ -7619,13 +8275,12 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                 )
                 output = result.stdout
                 
-                # Use robust string splitting instead of regex
-                for line in output.splitlines():
-                    if "Shadow Copy Volume:" in line:
-                        path = line.split(":", 1)[1].strip()
-                        if "HarddiskVolumeShadowCopy" in path:
-                            self.log(f"vssadmin successful. Found shadow path: {path}")
-                            return path
+                # One pass over the output with a precompiled pattern
+                shadow_volume_match = _SHADOW_VOLUME_PATTERN.search(output)
+                if shadow_volume_match:
+                    path = shadow_volume_match.group(1)
+                    self.log(f"vssadmin successful. Found shadow path: {path}")
+                    return path
 
                 self.log(f"Could not parse shadow path from vssadmin output on attempt {attempt}.")
                 self.log(f"Full vssadmin output:\n{output}")
@@ -7650,16 +8305,13 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
             # Use PowerShell for more reliable deletion. WMI filter needs the ID with braces.
             ps_cmd = f"(Get-WmiObject Win32_ShadowCopy -Filter \"ID='{shadow_id}'\").Delete()"
             
-            ps_proc = subprocess.run([
-                "powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", ps_cmd
-            ], capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            ps_success, ps_output = self.query_powershell(ps_cmd, timeout=30)
 
-            if ps_proc.returncode == 0 and not ps_proc.stderr:
+            if ps_success:
                 self.log(f"SUCCESS: VSS shadow copy {shadow_id} deleted successfully.")
             else:
                 self.log(f"WARNING: Failed to delete VSS shadow copy {shadow_id}.")
-                self.log(f"  PowerShell stderr: {ps_proc.stderr.strip()}")
-                self.log(f"  PowerShell stdout: {ps_proc.stdout.strip()}")
+                self.log(f"  PowerShell output: {ps_output.strip()}")
                 self.log("  Fallback: Trying vssadmin...")
                 
                 vss_cmd = ["vssadmin", "delete", "shadows", f"/shadow={shadow_id}", "/quiet"]
@@ -7672,15 +8324,25 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
         except Exception as e:
             self.log(f"WARNING: Exception during VSS cleanup: {e}")
 
+    def get_logical_drive_mask(self, max_age=2.0):
+        """Returns the GetLogicalDrives bitmask, reusing a result younger than max_age seconds"""
+        mask, timestamp = self._drive_mask_cache
+        now = time.monotonic()
+        if now - timestamp >= max_age:
+            mask = ctypes.windll.kernel32.GetLogicalDrives()
+            self._drive_mask_cache = (mask, now)
+        return mask
+
     def create_vss_drive_mapping(self, shadow_path):
         """Create a temporary drive letter mapping for VSS shadow copy path"""
         try:
-            # Find an available drive letter
+            # Find an available drive letter from the GetLogicalDrives bitmask
+            # (one call, no filesystem probes that can stall on dead mapped drives)
+            drive_mask = self.get_logical_drive_mask()
             available_letters = []
-            for letter in "ZYXWVUTSRQPONMLKJIHGFED":  # Start from Z and work backwards
-                drive_path = f"{letter}:\\"
-                if not os.path.exists(drive_path):
-                    available_letters.append(letter)
+            for bit in range(25, 2, -1):  # Start from Z and work backwards to D
+                if not (drive_mask >> bit) & 1:
+                    available_letters.append(chr(ord('A') + bit))
             
             if not available_letters:
                 self.log("WARNING: No available drive letters for VSS mapping")
@@ -7689,14 +8351,21 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
             drive_letter = available_letters[0]
             self.log(f"INFO: Creating drive mapping {drive_letter}: -> {shadow_path}")
             
-            # Method 1: Try subst command with proper escaping
+            # Method 1: Define the drive letter directly (what subst does, without a process)
             # Remove any trailing backslashes and requote properly
             clean_shadow_path = shadow_path.rstrip('\\')
-            subst_cmd = ['subst', f'{drive_letter}:', clean_shadow_path]
-            self.log(f"DEBUG: Running command: {' '.join(subst_cmd)}")
-            result = subprocess.run(subst_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            globalroot_prefix = "\\\\?\\GLOBALROOT"
+            if clean_shadow_path.upper().startswith(globalroot_prefix.upper()):
+                # Map the NT device path as-is (DDD_RAW_TARGET_PATH = 1)
+                define_flags = 1
+                define_target = clean_shadow_path[len(globalroot_prefix):]
+            else:
+                define_flags = 0
+                define_target = clean_shadow_path
+            self.log(f"DEBUG: DefineDosDevice {drive_letter}: -> {define_target}")
             
-            if result.returncode == 0:
+            if _DefineDosDeviceW(define_flags, f'{drive_letter}:', define_target):
+                self._drive_mask_cache = (0, 0.0)
                 # Give Windows a moment to register the mapping
                 time.sleep(1)
                 # Verify the mapping worked
@@ -7706,34 +8375,30 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                     return test_drive
                 else:
                     self.log(f"ERROR: Drive mapping created but not accessible: {test_drive}")
-                    # Try to see what drives exist
-                    try:
-                        import win32api
-                        drives = win32api.GetLogicalDriveStrings()
-                        self.log(f"DEBUG: Available drives: {drives}")
-                    except:
-                        pass
+                    self.log(f"DEBUG: Logical drive mask: {self.get_logical_drive_mask(max_age=0):026b}")
+                    # Drop the unusable definition so the letter can be reused below
+                    _DefineDosDeviceW(2, f'{drive_letter}:', None)
+                    self._drive_mask_cache = (0, 0.0)
             else:
-                self.log(f"ERROR: subst command failed with return code {result.returncode}")
-                self.log(f"ERROR: subst stderr: {result.stderr.strip()}")
-                self.log(f"ERROR: subst stdout: {result.stdout.strip()}")
-                
-            # Method 1b: Try subst with PowerShell (sometimes works better)
-            self.log("INFO: Trying subst via PowerShell...")
-            ps_subst_cmd = f'subst {drive_letter}: "{clean_shadow_path}"'
-            ps_result = subprocess.run(['powershell', '-Command', ps_subst_cmd], 
-                                     capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            if ps_result.returncode == 0:
-                time.sleep(1)
-                test_drive = f"{drive_letter}:\\"
-                if os.path.exists(test_drive):
-                    self.log(f"SUCCESS: PowerShell subst created drive mapping {drive_letter}:")
-                    return test_drive
+                self.log(f"ERROR: DefineDosDevice failed: {ctypes.WinError()}")
+                
+            # Method 1b: Map the full \\?\GLOBALROOT path the way subst does (still in-process,
+            # replaces the old PowerShell + subst.exe fallback)
+            if define_flags:
+                self.log("INFO: Trying DOS device mapping of the full shadow path...")
+                if _DefineDosDeviceW(0, f'{drive_letter}:', clean_shadow_path):
+                    self._drive_mask_cache = (0, 0.0)
+                    time.sleep(1)
+                    test_drive = f"{drive_letter}:\\"
+                    if os.path.exists(test_drive):
+                        self.log(f"SUCCESS: Created drive mapping {drive_letter}: for full shadow path")
+                        return test_drive
+                    else:
+                        self.log(f"ERROR: Full-path mapping created but not accessible: {test_drive}")
+                        _DefineDosDeviceW(2, f'{drive_letter}:', None)
+                        self._drive_mask_cache = (0, 0.0)
                 else:
-                    self.log(f"ERROR: PowerShell subst mapping created but not accessible: {test_drive}")
-            else:
-                self.log(f"ERROR: PowerShell subst failed: {ps_result.stderr.strip()}")
+                    self.log(f"ERROR: Full-path DefineDosDevice failed: {ctypes.WinError()}")
             
             # Method 2: Try creating directory junction (often works better with VSS)
             self.log("INFO: Trying alternative method - creating directory junction...")
@@ -7743,16 +8408,13 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                 
                 # Remove existing temp dir if it exists
                 if os.path.exists(temp_dir):
-                    try:
-                        subprocess.run(['rmdir', '/S', '/Q', temp_dir], shell=True, capture_output=True)
-                    except:
-                        pass
+                    self.remove_mount_directory(temp_dir)
                 
-                os.makedirs(temp_dir, exist_ok=True)
-                
-                # Try mklink to create directory junction with clean path
-                mklink_cmd = ['mklink', '/J', temp_dir, clean_shadow_path]
-                self.log(f"DEBUG: Running mklink command: {' '.join(mklink_cmd)}")
+                # Try mklink to create directory junction with clean path; mklink /J creates
+                # the link directory itself and fails if the path already exists
+                # mklink is a cmd.exe builtin, not an executable, so it has to go through cmd /c
+                mklink_cmd = ['cmd', '/c', 'mklink', '/J', temp_dir, clean_shadow_path]
+                self.log(f"DEBUG: Running mklink command: {subprocess.list2cmdline(mklink_cmd)}")
                 mklink_result = subprocess.run(mklink_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
                 
                 if mklink_result.returncode == 0:
@@ -7795,40 +8457,41 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                 letter = mapped_path[0].upper()
                 self.log(f"INFO: Removing drive mapping {letter}:")
                 
-                subst_cmd = f'subst {letter}: /D'
-                result = subprocess.run(subst_cmd, shell=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                
-                if result.returncode == 0:
+                # DDD_REMOVE_DEFINITION = 2, removes the most recent mapping for the letter
+                if _DefineDosDeviceW(2, f'{letter}:', None):
+                    self._drive_mask_cache = (0, 0.0)
                     self.log(f"SUCCESS: Removed drive mapping {letter}:")
                 else:
-                    self.log(f"WARNING: Failed to remove drive mapping: {result.stderr}")
+                    self.log(f"WARNING: Failed to remove drive mapping: {ctypes.WinError()}")
             
             # Check if it's a junction/temp directory (e.g., "C:\temp_vss_mount_Z\")
             elif mapped_path.startswith("C:\\temp_vss_mount_"):
                 self.log(f"INFO: Removing junction directory: {mapped_path}")
-                try:
-                    # Remove junction using rmdir
-                    rmdir_cmd = f'rmdir "{mapped_path.rstrip(chr(92))}"'
-                    result = subprocess.run(rmdir_cmd, shell=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                    
-                    if result.returncode == 0:
-                        self.log(f"SUCCESS: Removed junction directory")
-                    else:
-                        self.log(f"WARNING: Failed to remove junction: {result.stderr}")
-                        # Try with /S flag to force removal
-                        rmdir_cmd_force = f'rmdir /S /Q "{mapped_path.rstrip(chr(92))}"'
-                        result2 = subprocess.run(rmdir_cmd_force, shell=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                        if result2.returncode == 0:
-                            self.log(f"SUCCESS: Force removed junction directory")
-                        else:
-                            self.log(f"WARNING: Force removal also failed: {result2.stderr}")
-                            
-                except Exception as e:
-                    self.log(f"WARNING: Exception removing junction: {e}")
+                if self.remove_mount_directory(mapped_path.rstrip(chr(92))):
+                    self.log(f"SUCCESS: Removed junction directory")
                     
         except Exception as e:
             self.log(f"WARNING: Exception removing VSS mapping: {e}")
 
+    def remove_mount_directory(self, path):
+        """Remove a junction or temporary mount directory without going through cmd.exe"""
+        try:
+            # os.rmdir deletes a junction itself, never the shadow copy contents behind it
+            os.rmdir(path)
+            return True
+        except OSError as e:
+            self.log(f"WARNING: Failed to remove junction: {e}")
+        
+        try:
+            # Only a plain directory with leftover contents gets a recursive delete
+            if not os.lstat(path).st_file_attributes & stat.FILE_ATTRIBUTE_REPARSE_POINT:
+                shutil.rmtree(path)
+                self.log(f"SUCCESS: Force removed junction directory")
+                return True
+        except Exception as e:
+            self.log(f"WARNING: Force removal also failed: {e}")
+        return False
+
     def create_direct_wim_image(self):
         """Creates a WIM image using DISM directly (risky approach)."""
         # This method is deprecated - use the modern restic backup workflow instead
@@ -7896,19 +8559,51 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
             if hasattr(self, 'direct_create_button'):
                 self.direct_create_button.config(state="normal")
 
+    def remember_restic_version(self, restic_exe, version_info):
+        """Records the version output of a verified restic.exe against its size and mtime."""
+        try:
+            st = restic_exe.stat()
+            self._restic_verified = ((st.st_size, st.st_mtime_ns), version_info)
+        except OSError:
+            self._restic_verified = None
+
+    def get_verified_restic_version(self, restic_exe):
+        """Returns the cached version output if restic.exe is unchanged since it was verified."""
+        if not self._restic_verified:
+            return None
+        try:
+            st = restic_exe.stat()
+        except OSError:
+            return None
+        signature, version_info = self._restic_verified
+        return version_info if signature == (st.st_size, st.st_mtime_ns) else None
+
     def download_restic(self):
         """Download the Restic v0.18.0 binary for Windows."""
+        # Callers on other threads wait for an in-progress download instead of starting another
+        with self._restic_lock:
+            return self._download_restic()
+
+    def _download_restic(self):
+        """Does the work for download_restic; call with _restic_lock held."""
         try:
-            restic_dir = Path("./restic")
-            restic_dir.mkdir(exist_ok=True)
-            restic_exe = restic_dir / "restic.exe"
+            restic_exe = self._restic_exe
             
-            if restic_exe.exists():
+            # Skip re-running "restic version" if the binary is unchanged since it was last
+            # verified; this is a single stat(), so it goes ahead of the existence check
+            version_info = self.get_verified_restic_version(restic_exe)
+            if version_info:
+                self.log(f"INFO: Restic binary already exists: {version_info}")
+                return str(restic_exe)
+            
+            restic_exe.parent.mkdir(exist_ok=True)
+            if os.path.isfile(restic_exe):
                 # Check if it's a valid executable
                 try:
                     version_proc = subprocess.run([str(restic_exe), "version"], 
                                                 capture_output=True, text=True, timeout=10)
                     if version_proc.returncode == 0:
+                        self.remember_restic_version(restic_exe, version_proc.stdout.strip())
                         self.log(f"INFO: Restic binary already exists: {version_proc.stdout.strip()}")
                         return str(restic_exe)
                     else:
@@ -7918,88 +8613,87 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                     self.log("WARNING: Could not verify existing restic.exe, re-downloading...")
                     restic_exe.unlink()
             
-            self.log("INFO: Downloading Restic v0.18.0 binary for Windows...")
-            
             # Use the direct download URL for Restic v0.18.0
             download_url = "https://github.com/restic/restic/releases/download/v0.18.0/restic_0.18.0_windows_amd64.zip"
-            self.log(f"INFO: Downloading from: {download_url}")
+            # The release archive is versioned and never changes, so it is kept next to the
+            # binary; a deleted or corrupted restic.exe is re-extracted without downloading again
+            archive_path = restic_exe.with_name("restic_0.18.0_windows_amd64.zip")
             
-            # Download and extract
             import zipfile
-            import tempfile
-            import requests
             
-            # Create temporary file for download
-            tmp_file_path = None
-            try:
-                with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as tmp_file:
-                    tmp_file_path = tmp_file.name
+            if archive_path.is_file():
+                self.log(f"INFO: Using previously downloaded archive: {archive_path}")
+            else:
+                self.log("INFO: Downloading Restic v0.18.0 binary for Windows...")
+                self.log(f"INFO: Downloading from: {download_url}")
+                
+                # Download into a .part file so an interrupted download is never mistaken for the archive
+                archive_part = archive_path.with_name(archive_path.name + ".part")
+                with open(archive_part, 'wb', buffering=1024 * 1024) as archive_file:
                     self.log("INFO: Starting download...")
-                    zip_response = requests.get(download_url, stream=True, timeout=120)
+                    zip_response = _HTTP.get(download_url, stream=True, timeout=(5, 120))
                     zip_response.raise_for_status()
                     
                     total_size = int(zip_response.headers.get('content-length', 0))
+                    if total_size > 0:
+                        # Preallocate so the archive is laid out in one contiguous extent
+                        archive_file.truncate(total_size)
                     downloaded = 0
                     last_progress_logged = -1
                     
-                    for chunk in zip_response.iter_content(chunk_size=8192):
-                        if chunk:
-                            tmp_file.write(chunk)
-                            downloaded += len(chunk)
-                            if total_size > 0:
-                                progress = (downloaded / total_size) * 100
-                                # Log progress every 10%
-                                if int(progress / 10) > last_progress_logged:
-                                    last_progress_logged = int(progress / 10)
-                                    self.log(f"INFO: Download progress: {progress:.1f}%")
-                    
-                    tmp_file.flush()
+                    # Read the raw urllib3 stream directly in 1 MiB chunks - the archive is
+                    # binary, so iter_content's extra generator/copy layer buys nothing
+                    raw_stream = zip_response.raw
+                    raw_stream.decode_content = True
+                    while True:
+                        chunk = raw_stream.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        archive_file.write(chunk)
+                        downloaded += len(chunk)
+                        if total_size > 0:
+                            progress = (downloaded / total_size) * 100
+                            # Log progress every 10%
+                            if int(progress / 10) > last_progress_logged:
+                                last_progress_logged = int(progress / 10)
+                                self.log(f"INFO: Download progress: {progress:.1f}%")
+                os.replace(archive_part, archive_path)
                 
-                self.log("INFO: Download completed, extracting...")
+                self.log("INFO: Download completed")
+            
+            self.log("INFO: Extracting...")
+            
+            # Extract restic.exe from zip - the file should be named restic_0.18.0_windows_amd64.exe
+            try:
+                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                    extracted = False
+                    for file_info in zip_ref.filelist:
+                        # Look for the specific executable name or any .exe file
+                        if (file_info.filename == 'restic_0.18.0_windows_amd64.exe' or 
+                            file_info.filename.endswith('.exe')):
+                            self.log(f"INFO: Extracting {file_info.filename}...")
+                            # Extract to our restic directory
+                            # Stream in 1 MiB blocks rather than reading the whole binary into memory,
+                            # into a .part file so a failed extraction never leaves a truncated restic.exe
+                            part_path = restic_exe.with_name(restic_exe.name + ".part")
+                            with zip_ref.open(file_info) as source, open(part_path, 'wb', buffering=1024 * 1024) as target:
+                                shutil.copyfileobj(source, target, length=1024 * 1024)
+                            os.replace(part_path, restic_exe)
+                            extracted = True
+                            break
+                    
+                    if not extracted:
+                        self.log("ERROR: Could not find restic.exe in the downloaded ZIP file")
+                        self.log(f"ZIP contents: {[f.filename for f in zip_ref.filelist]}")
+                        return None
                 
-                # Add a small delay to ensure file handle is fully released
-                time.sleep(0.5)
+                self.log("INFO: Extraction completed")
                 
-                # Extract restic.exe from zip - the file should be named restic_0.18.0_windows_amd64.exe
-                try:
-                    with zipfile.ZipFile(tmp_file_path, 'r') as zip_ref:
-                        extracted = False
-                        for file_info in zip_ref.filelist:
-                            # Look for the specific executable name or any .exe file
-                            if (file_info.filename == 'restic_0.18.0_windows_amd64.exe' or 
-                                file_info.filename.endswith('.exe')):
-                                self.log(f"INFO: Extracting {file_info.filename}...")
-                                # Extract to our restic directory
-                                with zip_ref.open(file_info) as source, open(restic_exe, 'wb') as target:
-                                    target.write(source.read())
-                                extracted = True
-                                break
-                        
-                        if not extracted:
-                            self.log("ERROR: Could not find restic.exe in the downloaded ZIP file")
-                            self.log(f"ZIP contents: {[f.filename for f in zip_ref.filelist]}")
-                            return None
-                    
-                    self.log("INFO: Extraction completed")
-                    
-                except zipfile.BadZipFile as e:
-                    self.log(f"ERROR: Downloaded file is not a valid ZIP archive: {e}")
-                    return None
-                    
-            finally:
-                # Clean up temp file with retry logic
-                if tmp_file_path and Path(tmp_file_path).exists():
-                    for attempt in range(3):
-                        try:
-                            Path(tmp_file_path).unlink()
-                            self.log("INFO: Temporary download file cleaned up")
-                            break
-                        except PermissionError:
-                            if attempt < 2:
-                                self.log(f"INFO: Retrying temp file cleanup (attempt {attempt + 1}/3)")
-                                time.sleep(1)
-                            else:
-                                self.log(f"WARNING: Could not clean up temporary file: {tmp_file_path}")
+            except zipfile.BadZipFile as e:
+                self.log(f"ERROR: Downloaded file is not a valid ZIP archive: {e}")
+                # Drop the bad archive so the next attempt downloads a fresh copy
+                archive_path.unlink()
+                return None
             
             if restic_exe.exists():
                 # Verify the downloaded binary works
@@ -8009,6 +8703,7 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                                                 capture_output=True, text=True, timeout=10)
                     if version_proc.returncode == 0:
                         version_info = version_proc.stdout.strip()
+                        self.remember_restic_version(restic_exe, version_info)
                         self.log(f"SUCCESS: Restic downloaded and verified: {version_info}")
                         # Check if it's the expected version
                         if "0.18.0" in version_info:
@@ -8019,6 +8714,7 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                     else:
                         self.log(f"ERROR: Downloaded Restic binary failed verification: {version_proc.stderr}")
                         restic_exe.unlink()  # Remove corrupted file
+                        archive_path.unlink()  # ...and the archive it came from
                         return None
                 except Exception as e:
                     self.log(f"ERROR: Could not verify downloaded Restic binary: {e}")
@@ -8083,7 +8779,7 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                         self.log("DEBUG: No S3 config found in database")
                     
                     # Show helpful dialog
-                    messagebox.showerror("S3 Configuration Required", 
+                    self.show_error_from_worker("S3 Configuration Required", 
                         "S3 Cloud Storage is selected but not configured.\n\n" +
                         "Please either:\n" +
                         "1. Click 'Configure S3...' button to set up S3 credentials\n" +
@@ -8099,7 +8795,7 @@ Type 'I UNDERSTAND THE RISK' below to confirm:"""
                     self.log("SOLUTION: Set a local folder path for the repository")
                     
                     # Show helpful dialog
-                    messagebox.showerror("Local Path Required", 
+                    self.show_error_from_worker("Local Path Required", 
                         "Local File System is selected but no path is configured.\n\n" +
                         "Please set a local folder path where the backup repository will be stored.\n\n" +
                         "Example: C:\\Backups\\ResticRepo")
@@ -8729,11 +9425,14 @@ Check your password manager or secure notes where you saved it."""
         try:
             restic_exe = self.download_restic()
             if restic_exe:
-                version_proc = subprocess.run([str(restic_exe), "version"], 
-                                            capture_output=True, text=True, timeout=10)
-                if version_proc.returncode == 0:
+                # download_restic has just verified the binary, so its output is cached
+                version_line = self.get_verified_restic_version(Path(restic_exe))
+                if version_line is None:
+                    version_proc = subprocess.run([str(restic_exe), "version"], 
+                                                capture_output=True, text=True, timeout=10)
+                    version_line = version_proc.stdout.strip() if version_proc.returncode == 0 else ""
+                if version_line:
                     # Extract version from output like "restic 0.18.0 compiled with go1.24.1 on windows/amd64"
-                    version_line = version_proc.stdout.strip()
                     if "restic" in version_line:
                         parts = version_line.split()
                         if len(parts) >= 2:
@@ -8776,14 +9475,11 @@ Check your password manager or secure notes where you saved it."""
             
             self.log("INFO: Retrieving hardware information via WMI...")
             
-            result = subprocess.run([
-                "powershell", "-NoProfile", "-ExecutionPolicy", "Bypass", "-Command", powershell_cmd
-            ], capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=30)
+            ps_success, ps_output = self.query_powershell(powershell_cmd, timeout=30)
             
-            if result.returncode == 0 and result.stdout.strip():
+            if ps_success and ps_output.strip():
                 try:
-                    import json
-                    wmi_data = json.loads(result.stdout.strip())
+                    wmi_data = json.loads(ps_output.strip())
                     
                     # Extract and clean the data
                     system_uuid = wmi_data.get('SystemUUID', '').strip()
@@ -8823,10 +9519,8 @@ Check your password manager or secure notes where you saved it."""
                 except Exception as e:
                     self.log(f"WARNING: Failed to process WMI data: {e}")
             else:
-                self.log(f"WARNING: PowerShell WMI query failed: {result.stderr}")
+                self.log(f"WARNING: PowerShell WMI query failed: {ps_output}")
                 
-        except subprocess.TimeoutExpired:
-            self.log("WARNING: WMI query timed out after 30 seconds")
         except Exception as e:
             self.log(f"WARNING: Failed to retrieve hardware information: {e}")
         
@@ -8850,9 +9544,10 @@ Check your password manager or secure notes where you saved it."""
     def perform_restic_backup(self, restic_exe):
         """Perform the actual restic backup with VSS"""
         try:
-            # Check if user wants OS-only backup
+            # Check if user wants OS-only backup - read the Tk variable once up front
             os_only = getattr(self, 'capture_os_only_var', None)
-            if os_only and os_only.get():
+            capture_os_only = bool(os_only and os_only.get())
+            if capture_os_only:
                 self.log("INFO: Starting Restic backup (OS files only) with Volume Shadow Copy (VSS)...")
             else:
                 self.log("INFO: Starting Restic backup (full C: drive) with Volume Shadow Copy (VSS)...")
@@ -8880,72 +9575,19 @@ Check your password manager or secure notes where you saved it."""
                 backup_cmd.extend(["--tag", tag])
             
             # Add exclusions
-            exclusions = [
-                "C:/Windows/Temp/*", "C:/Windows/Logs/*", "C:/Windows/Prefetch/*",
-                "C:/Temp/*", "C:/$Recycle.Bin/*", "C:/System Volume Information/*",
-                "C:/pagefile.sys", "C:/hiberfil.sys", "C:/swapfile.sys",
-                "*/Temporary Internet Files/*", "*/AppData/Local/Temp/*",
-                "*/AppData/Local/Microsoft/Windows/INetCache/*",
-                "C:/Windows/SoftwareDistribution/*",  # Windows Update files
-                "C:/Windows/Installer/*",  # MSI installer cache
-                "C:/ProgramData/Microsoft/Windows/WER/*",  # Windows Error Reporting
-                "*/OneDrive*",  # OneDrive cloud-only files that cause VSS issues
-                "*OneDrive*",   # Additional OneDrive pattern
-                # UWP/Windows Store App exclusions (cause access denied errors)
-                "C:/ProgramData/Packages/*",  # All UWP app package data
-                "C:/Program Files/WindowsApps/*",  # Windows Store apps
-                "*/AppData/Local/Packages/*",  # User UWP app data
-                "*/AppData/Local/Microsoft/WindowsApps/*",  # Windows app shortcuts
-                "C:/Windows/SystemApps/*",  # System UWP apps
-                # Specific cache patterns that cause issues
-                "*/SystemAppData/Helium/Cache/*",  # Helium cache files
-                "*/AppData/Local/ConnectedDevicesPlatform/*",  # Connected devices cache
-                "*/AppData/Local/Microsoft/Windows/Explorer/*",  # Explorer cache
-                "C:/ProgramData/USOPrivate/*",  # Update session orchestrator
-                "C:/ProgramData/USOShared/*",   # Update session orchestrator shared
-                # Additional problematic Windows areas
-                "C:/Windows/CloudAPCache/*",  # Azure AD and cloud authentication cache
-                "C:/Windows/SystemTemp/*",   # System temporary files
-                "C:/Windows/ServiceProfiles/*/AppData/Local/Temp/*",  # Service profile temp
-                "C:/Windows/System32/config/systemprofile/AppData/Local/Microsoft/Windows/CloudAPCache/*",  # System profile cloud cache
-                "C:/Windows/System32/config/*/AppData/Local/Microsoft/Windows/CloudAPCache/*",  # All system profiles cloud cache
-                "C:/Windows/Temp/*",  # Additional temp pattern
-                "C:/Windows/CbsTemp/*",  # Component-based servicing temp
-                # Security and Defender exclusions (cause access denied errors)
-                "C:/ProgramData/Microsoft/Crypto/*",  # Cryptographic keys and certificates
-                "C:/ProgramData/Microsoft/Windows/CapabilityAccessManager/*",  # Capability access manager
-                "C:/ProgramData/Microsoft/Windows/SystemData/*",  # System data and lock screen images
-                "C:/ProgramData/Microsoft/Windows Defender/*",  # Windows Defender files
-                "C:/ProgramData/Microsoft/Windows Defender Advanced Threat Protection/*",  # Defender ATP
-                "*/Windows Defender/*",  # Additional Defender pattern
-                "*/Windows Security/*",  # Windows Security app data
-                # Client Side Caching and WMI exclusions (cause access denied errors)
-                "C:/Windows/CSC/*",  # Client Side Caching (Offline Files)
-                "C:/Windows/System32/LogFiles/WMI/*",  # WMI Event Trace Logs
-                "C:/Windows/System32/LogFiles/WMI/RtBackup/*",  # WMI real-time backup logs
-                "*/LogFiles/WMI/*",  # Additional WMI log pattern
-                "*/CSC/*",  # Additional CSC pattern
-            ]
-            
-            for exclusion in exclusions:
+            for exclusion in _RESTIC_EXCLUSIONS:
                 backup_cmd.extend(["--exclude", exclusion])
             
-            self.log(f"INFO: Added {len(exclusions)} standard exclusions for Windows")
+            self.log(f"INFO: Added {len(_RESTIC_EXCLUSIONS)} standard exclusions for Windows")
             # Note: --one-file-system is not supported on Windows, so we skip it
             self.log("INFO: Skipping --one-file-system flag (not supported on Windows)")
             
             # Add OS-only exclusions if selected
-            if os_only and os_only.get():
+            if capture_os_only:
                 self.log("INFO: Adding OS-only exclusions (excluding user data)")
-                os_exclusions = [
-                    "C:/Users/*/Documents/*", "C:/Users/*/Downloads/*", 
-                    "C:/Users/*/Pictures/*", "C:/Users/*/Videos/*",
-                    "C:/Users/*/Music/*", "C:/Users/*/Desktop/*",
-                    "C:/Users/*/AppData/Local/*", "C:/Users/*/AppData/LocalLow/*"
-                ]
-                for exclusion in os_exclusions:
+                for exclusion in _RESTIC_OS_EXCLUSIONS:
                     backup_cmd.extend(["--exclude", exclusion])
-                self.log(f"INFO: Added {len(os_exclusions)} OS-only exclusions")
+                self.log(f"INFO: Added {len(_RESTIC_OS_EXCLUSIONS)} OS-only exclusions")
             
             # Set environment variables for repository
             env = os.environ.copy()
@@ -9033,19 +9675,12 @@ Check your password manager or secure notes where you saved it."""
                 backup_cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                encoding='utf-8',
-                errors='ignore',
-                env=env
+                env=env,
+                bufsize=1 << 16
             )
             
-            # Stream output
-            while True:
-                line = process.stdout.readline()
-                if not line:
-                    break
-                if line.strip():
-                    self.log(f"RESTIC: {line.strip()}")
+            # Stream output in bulk reads
+            self.log_process_output(process.stdout, prefix="RESTIC: ")
             
             process.wait()
             
@@ -9529,7 +10164,7 @@ Check your password manager or secure notes where you saved it."""
                 # Standard settings
                 dism_cmd.extend(["/compress:fast", "/verify"])
             
-            self.log(f"COMMAND: {' '.join(dism_cmd)}")
+            self.log(f"COMMAND: {subprocess.list2cmdline(dism_cmd)}")
             self.log(f"INFO: Starting DISM capture via {method_name}...")
             
             # Execute DISM with better process handling
@@ -9537,9 +10172,7 @@ Check your password manager or secure notes where you saved it."""
                 dism_cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,  # Separate stderr
-                text=True,
-                encoding='utf-8',
-                errors='ignore'
+                bufsize=1 << 16
             )
             
             # Stream output with better error handling
@@ -9548,43 +10181,38 @@ Check your password manager or secure notes where you saved it."""
             
             try:
                 # Read output in a non-blocking way to prevent hanging
-                import select
-                import sys
-                
                 if sys.platform == 'win32':
                     # Windows doesn't support select on pipes, use threading
-                    import threading
-                    import queue
-                    
-                    def read_output(pipe, output_queue, line_list):
+                    def read_stream(pipe, stream_type, line_list):
+                        # One read1() of up to 64 KiB per wakeup; all complete lines in it are
+                        # queued as a single batch. DISM redraws progress with bare \r, so that
+                        # counts as a line break too
                         try:
-                            for line in iter(pipe.readline, ''):
-                                if not line:
+                            pending = b''
+                            while True:
+                                chunk = pipe.read1(65536)
+                                if not chunk:
                                     break
-                                line = line.strip()
-                                if line:
-                                    output_queue.put(('stdout', line))
-                                    line_list.append(line)
+                                complete, _, pending = (pending + chunk).replace(b'\r', b'\n').rpartition(b'\n')
+                                decoded = (line.strip() for line in complete.decode('utf-8', 'ignore').split('\n'))
+                                batch = [line for line in decoded if line]
+                                if batch:
+                                    output_queue.put((stream_type, batch))
+                                    line_list.extend(batch)
+                            last_line = pending.decode('utf-8', 'ignore').strip()
+                            if last_line:
+                                output_queue.put((stream_type, [last_line]))
+                                line_list.append(last_line)
                         except Exception as e:
-                            output_queue.put(('error', str(e)))
+                            output_queue.put(('error', [str(e)]))
                     
-                    def read_errors(pipe, output_queue, line_list):
-                        try:
-                            for line in iter(pipe.readline, ''):
-                                if not line:
-                                    break
-                                line = line.strip()
-                                if line:
-                                    output_queue.put(('stderr', line))
-                                    line_list.append(line)
-                        except Exception as e:
-                            output_queue.put(('error', str(e)))
-                    
-                    output_queue = queue.Queue()
+                    # Bounded so a stalled consumer caps memory instead of growing without limit;
+                    # the reader threads keep draining the pipes until it fills
+                    output_queue = queue.Queue(maxsize=10000)
                     
                     # Start threads to read stdout and stderr
-                    stdout_thread = threading.Thread(target=read_output, args=(dism_proc.stdout, output_queue, output_lines))
-                    stderr_thread = threading.Thread(target=read_errors, args=(dism_proc.stderr, output_queue, error_lines))
+                    stdout_thread = threading.Thread(target=read_stream, args=(dism_proc.stdout, 'stdout', output_lines))
+                    stderr_thread = threading.Thread(target=read_stream, args=(dism_proc.stderr, 'stderr', error_lines))
                     
                     stdout_thread.daemon = True
                     stderr_thread.daemon = True
@@ -9599,50 +10227,51 @@ Check your password manager or secure notes where you saved it."""
                     while dism_proc.poll() is None:
                         try:
                             # Check for new output with timeout
-                            stream_type, line = output_queue.get(timeout=30)  # 30 second timeout
+                            stream_type, batch = output_queue.get(timeout=30)  # 30 second timeout
                             
                             if stream_type == 'stdout':
-                                self.log(line)
+                                self.log_batch(batch)
                                 
-                                # Check for progress indicators
-                                if '%' in line and '[' in line:
-                                    try:
-                                        # Extract percentage
-                                        percent_str = line.split('%')[0].split()[-1]
-                                        current_progress = float(percent_str)
-                                        if current_progress > last_progress:
-                                            last_progress = current_progress
-                                            stalled_count = 0
-                                        else:
-                                            stalled_count += 1
-                                    except:
-                                        pass
-                                
-                                # Check for critical errors that indicate shadow copy issues
-                                if any(error in line.lower() for error in [
-                                    "the handle is invalid",
-                                    "access is denied", 
-                                    "the system cannot find the path specified",
-                                    "the filename, directory name, or volume label syntax is incorrect"
-                                ]):
-                                    self.log(f"ERROR: Critical error detected during DISM {method_name}: {line}")
-                                    self.log(f"ERROR: Shadow copy became invalid during capture")
-                                    self.log(f"ERROR: This is a common VSS issue - shadow copy lifetime expired")
-                                    self.log(f"SOLUTION: Try these steps:")
-                                    self.log(f"  1. Close all applications and background processes")
-                                    self.log(f"  2. Temporarily disable antivirus real-time protection")
-                                    self.log(f"  3. Increase virtual memory/page file size")
-                                    self.log(f"  4. Stop Windows Search service temporarily")
-                                    self.log(f"  5. Run: net stop themes (reduces memory usage)")
-                                    self.log(f"  6. Try smaller capture chunks if possible")
-                                    dism_proc.terminate()
-                                    return False
+                                for line in batch:
+                                    # Check for progress indicators
+                                    if '%' in line and '[' in line:
+                                        try:
+                                            # Extract percentage
+                                            percent_str = line.split('%')[0].split()[-1]
+                                            current_progress = float(percent_str)
+                                            if current_progress > last_progress:
+                                                last_progress = current_progress
+                                                stalled_count = 0
+                                            else:
+                                                stalled_count += 1
+                                        except:
+                                            pass
+                                    
+                                    # Check for critical errors that indicate shadow copy issues
+                                    if any(error in line.lower() for error in [
+                                        "the handle is invalid",
+                                        "access is denied", 
+                                        "the system cannot find the path specified",
+                                        "the filename, directory name, or volume label syntax is incorrect"
+                                    ]):
+                                        self.log(f"ERROR: Critical error detected during DISM {method_name}: {line}")
+                                        self.log(f"ERROR: Shadow copy became invalid during capture")
+                                        self.log(f"ERROR: This is a common VSS issue - shadow copy lifetime expired")
+                                        self.log(f"SOLUTION: Try these steps:")
+                                        self.log(f"  1. Close all applications and background processes")
+                                        self.log(f"  2. Temporarily disable antivirus real-time protection")
+                                        self.log(f"  3. Increase virtual memory/page file size")
+                                        self.log(f"  4. Stop Windows Search service temporarily")
+                                        self.log(f"  5. Run: net stop themes (reduces memory usage)")
+                                        self.log(f"  6. Try smaller capture chunks if possible")
+                                        dism_proc.terminate()
+                                        return False
                                     
                             elif stream_type == 'stderr':
-                                self.log(f"STDERR: {line}")
+                                self.log_batch([f"STDERR: {line}" for line in batch])
                                 
                             elif stream_type == 'error':
-                                self.log(f"THREAD ERROR: {line}")
+                                self.log(f"THREAD ERROR: {batch[0]}")
                                 
                         except queue.Empty:
                             # Timeout - check if process is still alive
@@ -9663,13 +10292,7 @@ Check your password manager or secure notes where you saved it."""
                 else:
                     # Non-Windows systems (fallback)
                     if dism_proc.stdout:
-                        for line in iter(dism_proc.stdout.readline, ''):
-                            if not line:
-                                break
-                            line = line.strip()
-                            if line:
-                                self.log(line)
-                                output_lines.append(line)
+                        self.log_process_output(dism_proc.stdout)
                 
                 # Wait for process to complete
                 dism_proc.wait()
@@ -9877,13 +10500,12 @@ Check your password manager or secure notes where you saved it."""
             progress_bar.start()
             status_var.set("Starting VHDX creation...")
             
+            dialog_log = self.queued_text_logger(log_text)
+            
             def log_to_dialog(message):
                 """Log message to the dialog"""
                 timestamp = datetime.now().strftime("%H:%M:%S")
-                formatted_message = f"[{timestamp}] {message}\n"
-                log_text.insert(tk.END, formatted_message)
-                log_text.see(tk.END)
-                log_text.update()
+                dialog_log(f"[{timestamp}] {message}\n")
                 self.log_step2(message)
             
             def creation_thread():
@@ -9934,30 +10556,21 @@ Check your password manager or secure notes where you saved it."""
             log_func(f"VHDX path: {vhdx_path}")
             log_func(f"Repository: {repo_data[4]}")  # repository_path
             
-            # Step 1: Create VHDX
-            status_var.set("Creating VHDX file...")
+            # Steps 1-2: Create, mount and partition the VHDX in a single PowerShell call
+            status_var.set("Creating, mounting and partitioning VHDX...")
             log_func("Step 1: Creating VHDX file...")
-            if not self.create_dynamic_vhdx(vhdx_path, vhdx_size_gb, log_func):
-                raise Exception("Failed to create VHDX file")
-            
-            # Step 2: Mount and partition VHDX
-            status_var.set("Mounting and partitioning VHDX...")
             log_func("Step 2: Mounting and partitioning VHDX...")
-            drive_letter = self.mount_and_partition_vhdx(vhdx_path, log_func)
-            if not drive_letter:
-                raise Exception("Failed to mount and partition VHDX")
-            
-            # Step 3: Restore from repository
-            status_var.set("Restoring from repository...")
-            log_func("Step 3: Restoring from repository...")
-            if not self.restore_repository_to_vhdx_partition(repo_data, drive_letter, log_func):
-                raise Exception("Failed to restore repository to VHDX")
-            
-            # Step 4: Unmount VHDX
-            status_var.set("Unmounting VHDX...")
-            log_func("Step 4: Unmounting VHDX...")
-            if not self.unmount_vhdx(vhdx_path, log_func):
-                log_func("Warning: Failed to cleanly unmount VHDX, but continuing...")
+            vhdx_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.mounted_vhdx(vhdx_path, log_func, create_size_gb=vhdx_size_gb) as drive_letter:
+                # Step 3: Restore from repository
+                status_var.set("Restoring from repository...")
+                log_func("Step 3: Restoring from repository...")
+                if not self.restore_repository_to_vhdx_partition(repo_data, drive_letter, log_func):
+                    raise Exception("Failed to restore repository to VHDX")
+                
+                # Step 4: Unmount VHDX - done when the with block exits, on failure too
+                status_var.set("Unmounting VHDX...")
+                log_func("Step 4: Unmounting VHDX...")
             
             # Step 5: Create VM
             status_var.set("Creating VM...")
@@ -9974,109 +10587,53 @@ Check your password manager or secure notes where you saved it."""
             status_var.set("Failed!")
             return False
 
-    def create_dynamic_vhdx(self, vhdx_path, size_gb, log_func):
-        """Create a dynamic VHDX file"""
-        try:
-            log_func(f"Creating dynamic VHDX: {vhdx_path}")
-            log_func(f"Size: {size_gb} GB")
-            
-            # Ensure parent directory exists
-            vhdx_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Create diskpart script for VHDX creation
-            script_content = f"""create vdisk file="{vhdx_path}" maximum={size_gb * 1024} type=expandable
-exit
-"""
-            
-            script_path = vhdx_path.parent / "create_vhdx.txt"
-            with open(script_path, 'w') as f:
-                f.write(script_content)
-            
-            log_func(f"Created diskpart script: {script_path}")
-            
-            # Run diskpart
-            cmd = ["diskpart", "/s", str(script_path)]
-            log_func(f"Running: {' '.join(cmd)}")
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            log_func(f"Diskpart return code: {result.returncode}")
-            if result.stdout:
-                log_func(f"STDOUT: {result.stdout}")
-            if result.stderr:
-                log_func(f"STDERR: {result.stderr}")
-            
-            # Clean up script
-            try:
-                script_path.unlink()
-            except:
-                pass
-            
-            if result.returncode == 0 and vhdx_path.exists():
-                log_func(f"✓ VHDX created successfully: {vhdx_path}")
-                return True
-            else:
-                log_func(f"✗ Failed to create VHDX")
-                return False
-                
-        except Exception as e:
-            log_func(f"✗ Error creating VHDX: {e}")
-            return False
-
-    def mount_and_partition_vhdx(self, vhdx_path, log_func):
-        """Mount VHDX and create partitions (EFI, Recovery, OS)"""
+    def mount_and_partition_vhdx(self, vhdx_path, log_func, create_size_gb=None):
+        """Mount VHDX and create partitions (EFI, Recovery, OS)
+        
+        If create_size_gb is given, the dynamic VHDX is created first in the same call.
+        """
         try:
             log_func("Mounting and partitioning VHDX...")
             
-            # Create diskpart script for mounting and partitioning
-            script_content = f"""select vdisk file="{vhdx_path}"
-attach vdisk
-create partition efi size=4096
-active
-format fs=fat32 quick label="EFI"
-assign letter=E
-create partition msr size=128
-create partition primary size=4096
-format fs=ntfs quick label="Recovery"
-assign letter=R
-create partition primary
-format fs=ntfs quick label="OS"
-assign letter=O
-list partition
-exit
+            # Attach and lay out the disk with the Storage cmdlets in the shared PowerShell
+            # session, instead of writing a script file for diskpart to parse
+            quoted_path = str(vhdx_path).replace("'", "''")
+            create_command = ""
+            if create_size_gb:
+                log_func(f"Creating dynamic VHDX: {vhdx_path} ({create_size_gb} GB)")
+                create_command = f"New-VHD -Path '{quoted_path}' -SizeBytes {create_size_gb}GB -Dynamic | Out-Null"
+            ps_command = f"""
+$ErrorActionPreference = 'Stop'
+{create_command}
+$disk = Mount-DiskImage -ImagePath '{quoted_path}' -PassThru | Get-Disk
+if ($disk.PartitionStyle -eq 'RAW') {{ Initialize-Disk -Number $disk.Number -PartitionStyle GPT }}
+$efi = New-Partition -DiskNumber $disk.Number -Size 4GB -GptType '{{c12a7328-f81f-11d2-ba4b-00a0c93ec93b}}' -DriveLetter E
+Format-Volume -Partition $efi -FileSystem FAT32 -NewFileSystemLabel 'EFI' -Force -Confirm:$false | Out-Null
+New-Partition -DiskNumber $disk.Number -Size 128MB -GptType '{{e3c9e316-0b5c-4db8-817d-f92df00215ae}}' | Out-Null
+$recovery = New-Partition -DiskNumber $disk.Number -Size 4GB -DriveLetter R
+Format-Volume -Partition $recovery -FileSystem NTFS -NewFileSystemLabel 'Recovery' -Force -Confirm:$false | Out-Null
+$os = New-Partition -DiskNumber $disk.Number -UseMaximumSize -DriveLetter O
+Format-Volume -Partition $os -FileSystem NTFS -NewFileSystemLabel 'OS' -Force -Confirm:$false | Out-Null
+@{{ DiskNumber = $disk.Number; OsDrive = [string]$os.DriveLetter }} | ConvertTo-Json -Compress
 """
             
-            script_path = vhdx_path.parent / "partition_vhdx.txt"
-            with open(script_path, 'w') as f:
-                f.write(script_content)
-            
-            log_func(f"Created partition script: {script_path}")
-            
-            # Run diskpart
-            cmd = ["diskpart", "/s", str(script_path)]
-            log_func(f"Running: {' '.join(cmd)}")
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            log_func(f"Diskpart return code: {result.returncode}")
-            if result.stdout:
-                log_func(f"STDOUT: {result.stdout}")
-            if result.stderr:
-                log_func(f"STDERR: {result.stderr}")
-            
-            # Clean up script
-            try:
-                script_path.unlink()
-            except:
-                pass
+            success, output = self.query_powershell(ps_command)
             
-            if result.returncode == 0:
-                log_func("✓ VHDX mounted and partitioned successfully")
+            if success:
+                # The last line is the JSON summary, anything before it is cmdlet output
+                lines = output.splitlines()
+                mount_info = json.loads(lines[-1])
+                if lines[:-1]:
+                    log_func("\n".join(lines[:-1]))
+                os_drive = mount_info['OsDrive']
+                log_func(f"✓ VHDX mounted as disk {mount_info['DiskNumber']} and partitioned successfully")
                 log_func("✓ EFI partition: E: (4GB, FAT32)")
                 log_func("✓ Recovery partition: R: (4GB, NTFS)")
-                log_func("✓ OS partition: O: (Remaining space, NTFS)")
-                return "O"  # Return OS drive letter
+                log_func(f"✓ OS partition: {os_drive}: (Remaining space, NTFS)")
+                return os_drive  # Return OS drive letter
             else:
+                if output:
+                    log_func(output)
                 log_func(f"✗ Failed to mount and partition VHDX")
                 return None
                 
@@ -10084,6 +10641,36 @@ exit
             log_func(f"✗ Error mounting and partitioning VHDX: {e}")
             return None
 
+    @contextmanager
+    def mounted_vhdx(self, vhdx_path, log_func, create_size_gb=None):
+        """Mounts and partitions a VHDX for a with block, yielding the OS drive letter.
+        
+        The image is always dismounted afterwards, so a failed run can't leak a mount.
+        """
+        drive_letter = self.mount_and_partition_vhdx(vhdx_path, log_func, create_size_gb=create_size_gb)
+        if not drive_letter:
+            # Partitioning may have failed after the disk was attached
+            if vhdx_path.exists():
+                self.dismount_vhdx_image(vhdx_path, log_func)
+            raise Exception("Failed to create, mount and partition VHDX")
+        try:
+            yield drive_letter
+        finally:
+            self.dismount_vhdx_image(vhdx_path, log_func)
+
+    def dismount_vhdx_image(self, vhdx_path, log_func):
+        """Dismounts a VHDX attached with Mount-DiskImage, retrying once."""
+        quoted_path = str(vhdx_path).replace("'", "''")
+        for attempt in range(2):
+            success, output = self.query_powershell(f"Dismount-DiskImage -ImagePath '{quoted_path}' | Out-Null")
+            if success:
+                log_func("✓ VHDX unmounted successfully")
+                return True
+            if output:
+                log_func(output)
+        log_func("Warning: Failed to cleanly unmount VHDX, but continuing...")
+        return False
+
     def restore_repository_to_vhdx_partition(self, repo_data, drive_letter, log_func):
         """Restore repository to the VHDX OS partition"""
         try:
@@ -10114,7 +10701,8 @@ exit
             # Find latest snapshot
             log_func("Finding latest snapshot...")
             snapshots_cmd = [restic_exe, "snapshots", "--json"]
-            result = subprocess.run(snapshots_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            result = subprocess.run(snapshots_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore',
+                                    timeout=_RESTIC_PROBE_TIMEOUT)
             
             if result.returncode != 0:
                 log_func(f"✗ Failed to query snapshots: {result.stderr}")
@@ -10138,17 +10726,14 @@ exit
             log_func(f"Restoring to: {target_path}")
             
             restore_cmd = [restic_exe, "restore", latest_snapshot, "--target", target_path]
-            log_func(f"Running: {' '.join(restore_cmd)}")
+            log_func(f"Running: {subprocess.list2cmdline(restore_cmd)}")
             
-            result = subprocess.run(restore_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            # Stream restic's output so a long restore shows progress as it runs
+            returncode = self.run_streaming(restore_cmd, log_func)
             
-            log_func(f"Restore return code: {result.returncode}")
-            if result.stdout:
-                log_func(f"STDOUT: {result.stdout}")
-            if result.stderr:
-                log_func(f"STDERR: {result.stderr}")
+            log_func(f"Restore return code: {returncode}")
             
-            if result.returncode == 0:
+            if returncode == 0:
                 log_func(f"✓ Repository restored successfully to {drive_letter}:")
                 return True
             else:
@@ -10159,66 +10744,19 @@ exit
             log_func(f"✗ Error restoring repository: {e}")
             return False
 
-    def unmount_vhdx(self, vhdx_path, log_func):
-        """Unmount the VHDX"""
-        try:
-            log_func("Unmounting VHDX...")
-            
-            # Create diskpart script for unmounting
-            script_content = f"""select vdisk file="{vhdx_path}"
-detach vdisk
-exit
-"""
-            
-            script_path = vhdx_path.parent / "unmount_vhdx.txt"
-            with open(script_path, 'w') as f:
-                f.write(script_content)
-            
-            log_func(f"Created unmount script: {script_path}")
-            
-            # Run diskpart
-            cmd = ["diskpart", "/s", str(script_path)]
-            log_func(f"Running: {' '.join(cmd)}")
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            log_func(f"Diskpart return code: {result.returncode}")
-            if result.stdout:
-                log_func(f"STDOUT: {result.stdout}")
-            if result.stderr:
-                log_func(f"STDERR: {result.stderr}")
-            
-            # Clean up script
-            try:
-                script_path.unlink()
-            except:
-                pass
-            
-            if result.returncode == 0:
-                log_func("✓ VHDX unmounted successfully")
-                return True
-            else:
-                log_func(f"✗ Failed to unmount VHDX")
-                return False
-                
-        except Exception as e:
-            log_func(f"✗ Error unmounting VHDX: {e}")
-            return False
-
     def create_hyperv_vm(self, vm_name, vhdx_path, log_func):
         """Create Hyper-V VM with specified configuration"""
         try:
             log_func(f"Creating Hyper-V VM: {vm_name}")
             
-            # Check if Hyper-V is available
-            check_cmd = ["powershell", "-Command", "Get-WindowsOptionalFeature -Online -FeatureName Microsoft-Hyper-V"]
-            result = subprocess.run(check_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            if "Enabled" not in result.stdout:
-                log_func("⚠ Hyper-V may not be enabled. VM creation might fail.")
-            
-            # Create VM with PowerShell
+            # Check Hyper-V and create the VM in a single PowerShell process
             ps_script = f'''
+# Check if Hyper-V is available
+$hyperV = Get-WindowsOptionalFeature -Online -FeatureName Microsoft-Hyper-V -ErrorAction SilentlyContinue
+if (-not $hyperV -or $hyperV.State -ne "Enabled") {{
+    Write-Host "HYPERV_NOT_ENABLED"
+}}
+
 # Create new VM
 New-VM -Name "{vm_name}" -MemoryStartupBytes 4GB -Generation 2
             
@@ -10243,11 +10781,14 @@ if ($hardDrive) {{
 Write-Host "VM created successfully: {vm_name}"
 '''
             
-            cmd = ["powershell", "-Command", ps_script]
+            cmd = _POWERSHELL_CORE + ["-Command", ps_script]
             log_func("Creating VM with PowerShell...")
             
             result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
             
+            if "HYPERV_NOT_ENABLED" in result.stdout:
+                log_func("⚠ Hyper-V may not be enabled. VM creation might fail.")
+            
             log_func(f"PowerShell return code: {result.returncode}")
             if result.stdout:
                 log_func(f"STDOUT: {result.stdout}")
@@ -10274,19 +10815,19 @@ def main():
     
     # Check if running as administrator
     try:
-        is_admin = ctypes.windll.shell32.IsUserAnAdmin()
+        is_admin = is_user_admin()
     except Exception as e:
         # Log this error to console if possible, useful for debugging
         print(f"Admin check failed: {e}")
         is_admin = False
 
     if not is_admin:
-        # Using tk._default_root to show messagebox without a full Tk window
-        # This is a bit of a hack, but works for this purpose.
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showerror("Administrator Required", "This application must be started with Administrator privileges.")
-        root.destroy()
+        # Show the error with a plain Win32 message box so Tcl/Tk is never initialised
+        # on this path (0x10 = MB_ICONERROR)
+        ctypes.windll.user32.MessageBoxW(
+            None, "This application must be started with Administrator privileges.",
+            "Administrator Required", 0x10
+        )
     else:
         root = tk.Tk()
         app = WindowsImagePrepGUI(root)